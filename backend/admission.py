@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+# Deployment-wide limits. Each of the WEB_CONCURRENCY worker processes
+# enforces its share in memory (see per_worker): connections spread evenly
+# across workers, and a SQLite-backed bucket would put a write on the very
+# lock admission control protects.
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+# Per-client budget: sustained submissions per second and burst size
+CLIENT_RATE_PER_SECOND = 1.0
+CLIENT_BURST = 5
+
+# SQLite has a single writer; admitted writes are group-committed by the write
+# coalescer, so let in about one batch at a time and queue the rest
+MAX_CONCURRENT_WRITES = 32
+MAX_QUEUED_WRITES = 200
+
+# Upper bound on the number of clients whose buckets are remembered
+MAX_TRACKED_CLIENTS = 10000
+
+
+def per_worker(total: float, minimum: float = 0.0) -> float:
+    """This process's share of a deployment-wide limit."""
+    return max(minimum, total / WORKERS)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Token bucket per client in front of a bounded, fair queue for the write path.
+
+    Waiting requests are served round-robin across clients, so one client
+    firing many requests cannot push everyone else to the back. When the
+    queue is full, callers are rejected immediately with a Retry-After hint
+    instead of piling up behind the database lock.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                 max_concurrent: Optional[int] = None, max_queued: Optional[int] = None):
+        # Defaults are this worker's share; a bucket needs room for at least one token
+        self.rate = rate if rate is not None else per_worker(CLIENT_RATE_PER_SECOND)
+        self.burst = burst if burst is not None else per_worker(CLIENT_BURST, minimum=1)
+        self.max_concurrent = (max_concurrent if max_concurrent is not None
+                               else int(per_worker(MAX_CONCURRENT_WRITES, minimum=1)))
+        self.max_queued = max_queued if max_queued is not None else int(per_worker(MAX_QUEUED_WRITES))
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        self._turns: Deque[str] = deque()
+        self._queued = 0
+        self._active = 0
+        self._service_time = 0.05
+        self.stats = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "queued": 0}
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _estimated_wait(self) -> float:
+        return (self._queued + 1) * self._service_time / self.max_concurrent
+
+    def _enqueue(self, key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if key not in self._waiting:
+            self._waiting[key] = deque()
+            self._turns.append(key)
+        self._waiting[key].append(future)
+        self._queued += 1
+        return future
+
+    def _hand_over(self):
+        # Give the freed slot to the next client in round-robin order
+        while self._turns and self._active < self.max_concurrent:
+            key = self._turns.popleft()
+            waiters = self._waiting[key]
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._turns.append(key)
+            else:
+                del self._waiting[key]
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    def _cancel(self, key: str, future: asyncio.Future):
+        waiters = self._waiting.get(key)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[key]
+                self._turns.remove(key)
+
+    @asynccontextmanager
+    async def admit(self, key: str):
+        wait = self._bucket(key).take()
+        if wait:
+            self.stats["rate_limited"] += 1
+            raise AdmissionRejected("Too many requests from this client", wait)
+
+        if self._active >= self.max_concurrent or self._queued:
+            if self._queued >= self.max_queued:
+                self.stats["queue_full"] += 1
+                raise AdmissionRejected("Server is busy, please retry", self._estimated_wait())
+            self.stats["queued"] += 1
+            future = self._enqueue(key)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed to us just as we were cancelled; pass it on
+                    self._active -= 1
+                    self._hand_over()
+                else:
+                    self._cancel(key, future)
+                raise
+        else:
+            self._active += 1
+
+        self.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # Moving average of how long a write holds its slot, for Retry-After estimates
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self._active -= 1
+            self._hand_over()
+
+    def snapshot(self) -> Dict:
+        # Counters are this worker's; with WEB_CONCURRENCY > 1 each process answers for itself
+        return {**self.stats, "workers": WORKERS, "active": self._active, "waiting": self._queued,
+                "avg_service_ms": round(self._service_time * 1000, 1)}
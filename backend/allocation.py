@@ -0,0 +1,293 @@
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from database import db
+from events import record_events
+from notifications import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Shift hours as offered in the booking form; night wraps past midnight
+SHIFT_HOURS = {
+    "morning": (9, 18),
+    "evening": (14, 23),
+    "night": (23, 8),
+}
+
+# Requests without a known shift are treated as needing the slot all day
+FULL_DAY_MASK = (1 << 24) - 1
+
+# How far back the rollups are read to weight teams and shifts by past usage
+HISTORY_DAYS = 30
+
+SLOT_PREFIX = {"car": "C", "bike": "B"}
+
+
+def shift_mask(shift: Optional[str]) -> int:
+    """Bitmask of the hours a shift uses the slot; two shifts can share it when masks don't intersect."""
+    hours = SHIFT_HOURS.get((shift or "").lower())
+    if not hours:
+        return FULL_DAY_MASK
+    start, end = hours
+    span = range(start, end) if start < end else list(range(start, 24)) + list(range(0, end))
+    mask = 0
+    for hour in span:
+        mask |= 1 << hour
+    return mask
+
+
+def slot_label(vehicle_type: str, index: int) -> str:
+    return f"{SLOT_PREFIX.get(vehicle_type, 'S')}-{index + 1}"
+
+
+def slot_index(slot_number: Optional[str]) -> Optional[int]:
+    try:
+        return int(str(slot_number).rsplit("-", 1)[1]) - 1
+    except (IndexError, ValueError):
+        return None
+
+
+def _usage_weights(labels, usage: Dict[str, float]):
+    """1 / (1 + usage relative to the mean), so groups that got more in the past rank lower."""
+    import numpy as np
+    history = np.array([usage.get(label, 0.0) for label in labels], dtype=float)
+    mean = history.mean() if history.size else 0.0
+    if mean <= 0:
+        return np.ones(len(labels))
+    return 1.0 / (1.0 + history / mean)
+
+
+def plan_allocation(requests: Sequence[Dict], capacity: int, slot_masks: Optional[Sequence[int]] = None,
+                    team_usage: Optional[Dict[str, float]] = None,
+                    shift_usage: Optional[Dict[str, float]] = None) -> List[Optional[int]]:
+    """Assign slot indexes to ``requests`` (oldest first); None means no slot.
+
+    Requests are grouped into (team, shift) cells and served in weighted
+    fair order: the k-th request of a cell gets virtual time k / weight,
+    where the weight falls with the team's and the shift's historical usage.
+    Slots are then filled in that order, packing shifts whose hours don't
+    overlap into the same slot. ``slot_masks`` holds hours already taken
+    on each slot by existing approvals.
+    """
+    import numpy as np
+    n = len(requests)
+    if n == 0 or capacity <= 0:
+        return [None] * n
+
+    teams, team_codes = np.unique(np.array([r.get("team") or "" for r in requests]), return_inverse=True)
+    shifts, shift_codes = np.unique(np.array([(r.get("shift") or "").lower() for r in requests]),
+                                    return_inverse=True)
+    weights = (_usage_weights(teams, team_usage or {})[team_codes]
+               * _usage_weights(shifts, shift_usage or {})[shift_codes])
+
+    # Position of each request within its cell, in arrival order
+    cells = team_codes * len(shifts) + shift_codes
+    arrival = np.arange(n)
+    order = np.lexsort((arrival, cells))
+    sorted_cells = cells[order]
+    cell_start = np.r_[0, np.flatnonzero(np.diff(sorted_cells)) + 1]
+    starts = np.repeat(cell_start, np.diff(np.r_[cell_start, n]))
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - starts
+
+    priority = np.lexsort((arrival, (rank + 1) / weights))
+    masks = np.array([shift_mask(shifts[code]) for code in range(len(shifts))], dtype=np.int64)[shift_codes]
+
+    taken = np.zeros(capacity, dtype=np.int64)
+    if slot_masks is not None:
+        taken[:len(slot_masks)] = np.asarray(slot_masks[:capacity], dtype=np.int64)
+
+    assigned: List[Optional[int]] = [None] * n
+    exhausted = set()
+    for i in priority.tolist():
+        mask = int(masks[i])
+        # Slots only fill up, so a shift that found no room once never will
+        if mask in exhausted:
+            continue
+        fits = (taken & mask) == 0
+        shared = np.flatnonzero(fits & (taken != 0))
+        free = shared if shared.size else np.flatnonzero(fits)
+        if not free.size:
+            exhausted.add(mask)
+            continue
+        slot = int(free[0])
+        taken[slot] |= mask
+        assigned[i] = slot
+    return assigned
+
+
+def next_free_slot(conn, office_id: str, vehicle_type: str, total: int) -> Optional[str]:
+    """Lowest-numbered slot not held by any approved request of the office, if any."""
+    held = {slot_index(row["slot_number"]) for row in conn.execute(
+        "SELECT DISTINCT slot_number FROM parking_requests "
+        "WHERE office_id = ? AND vehicle_type = ? AND status = 'approved' AND slot_number IS NOT NULL",
+        (office_id, vehicle_type)
+    )}
+    for index in range(total):
+        if index not in held:
+            return slot_label(vehicle_type, index)
+    return None
+
+
+def release_slot(conn, office_id: str, vehicle_type: str, slot_number: Optional[str], request_id: str) -> bool:
+    """Hand a slot back to the office as ``request_id`` stops holding it.
+
+    Shifts can share a slot, so it only counts as free once no other
+    approval holds the same number. Returns whether availability went up.
+    """
+    if vehicle_type not in SLOT_PREFIX:
+        return False
+    if slot_number is not None and conn.execute(
+        "SELECT 1 FROM parking_requests WHERE office_id = ? AND vehicle_type = ? AND status = 'approved' "
+        "AND slot_number = ? AND id != ? LIMIT 1",
+        (office_id, vehicle_type, slot_number, request_id)
+    ).fetchone():
+        return False
+    conn.execute(
+        f"UPDATE offices SET available_{vehicle_type}_slots = "
+        f"MIN(total_{vehicle_type}_slots, available_{vehicle_type}_slots + 1) WHERE id = ?",
+        (office_id,)
+    )
+    return True
+
+
+def _history(conn, day: str, office_id: str, vehicle_type: str, history_days: int):
+    since = (date.fromisoformat(day) - timedelta(days=history_days)).isoformat()
+    team_usage, shift_usage = {}, {}
+    for row in conn.execute(
+        """
+        SELECT team, shift, SUM(occupied) AS occupied FROM daily_utilisation
+        WHERE office_id = ? AND vehicle_type = ? AND day >= ? AND day < ?
+        GROUP BY team, shift
+        """,
+        (office_id, vehicle_type, since, day)
+    ):
+        team_usage[row["team"]] = team_usage.get(row["team"], 0) + row["occupied"]
+        shift_usage[row["shift"]] = shift_usage.get(row["shift"], 0) + row["occupied"]
+    return team_usage, shift_usage
+
+
+def allocate_day(day: str, office_id: str, vehicle_type: str, dry_run: bool = False,
+                 history_days: int = HISTORY_DAYS) -> Dict:
+    """Batch-allocate every open single-day request for ``day`` at one office.
+
+    Winners are approved with a slot number; the rest are waitlisted.
+    Multi-day bookings are left to manual approval, since a slot that is
+    free on ``day`` may not be free for their whole range.
+    """
+    started = time.perf_counter()
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        office = conn.execute("SELECT * FROM offices WHERE id = ?", (office_id,)).fetchone()
+        if not office:
+            raise LookupError(f"Office {office_id} not found")
+        capacity = office[f"total_{vehicle_type}_slots"]
+
+        requests = [dict(row) for row in conn.execute(
+            """
+            SELECT p.id, p.status, p.user_id, COALESCE(u.team, '') AS team, COALESCE(u.shift, '') AS shift,
+                   u.name, u.email
+            FROM parking_requests p LEFT JOIN users u ON u.id = p.user_id
+            WHERE p.office_id = ? AND p.vehicle_type = ? AND p.status IN ('pending', 'waitlist')
+              AND COALESCE(p.start_date, p.parking_date) = ?
+              AND COALESCE(p.end_date, p.parking_date, p.start_date) = ?
+            ORDER BY p.created_at, p.id
+            """,
+            (office_id, vehicle_type, day, day)
+        )]
+
+        # Hours already taken on each slot by approvals covering the day
+        slot_masks = [0] * capacity
+        for row in conn.execute(
+            """
+            SELECT p.slot_number, u.shift FROM parking_requests p LEFT JOIN users u ON u.id = p.user_id
+            WHERE p.office_id = ? AND p.vehicle_type = ? AND p.status = 'approved'
+              AND COALESCE(p.start_date, p.parking_date) <= ?
+              AND COALESCE(p.end_date, p.parking_date, p.start_date) >= ?
+            """,
+            (office_id, vehicle_type, day, day)
+        ):
+            index = slot_index(row["slot_number"])
+            if index is not None and 0 <= index < capacity:
+                slot_masks[index] |= shift_mask(row["shift"])
+
+        team_usage, shift_usage = _history(conn, day, office_id, vehicle_type, history_days)
+        assigned = plan_allocation(requests, capacity, slot_masks, team_usage, shift_usage)
+
+        allocations, waitlisted = [], []
+        for request, slot in zip(requests, assigned):
+            if slot is None:
+                waitlisted.append(request)
+            else:
+                allocations.append({
+                    "request_id": request["id"], "slot_number": slot_label(vehicle_type, slot),
+                    "team": request["team"], "shift": request["shift"],
+                })
+
+        fairness = {}
+        for request, slot in zip(requests, assigned):
+            for dimension in ("team", "shift"):
+                stats = fairness.setdefault(dimension, {}).setdefault(
+                    request[dimension], {"requested": 0, "allocated": 0}
+                )
+                stats["requested"] += 1
+                stats["allocated"] += slot is not None
+
+        slots_used = {allocation["slot_number"] for allocation in allocations}
+        result = {
+            "day": day, "office_id": office_id, "vehicle_type": vehicle_type, "dry_run": dry_run,
+            "capacity": capacity, "requests": len(requests), "allocated": allocations,
+            "waitlisted": [request["id"] for request in waitlisted],
+            "slots_used": len(slots_used),
+            "shared_slots": len(allocations) - len(slots_used),
+            "fairness": fairness,
+        }
+
+        if not dry_run and requests:
+            now = datetime.now(timezone.utc).isoformat()
+            held = {row["slot_number"] for row in conn.execute(
+                "SELECT DISTINCT slot_number FROM parking_requests "
+                "WHERE office_id = ? AND vehicle_type = ? AND status = 'approved'",
+                (office_id, vehicle_type)
+            )}
+            conn.executemany(
+                "UPDATE parking_requests SET status = 'approved', slot_number = ?, approved_by = 'allocator', "
+                "updated_at = ? WHERE id = ?",
+                [(allocation["slot_number"], now, allocation["request_id"]) for allocation in allocations]
+            )
+            conn.executemany(
+                "UPDATE parking_requests SET status = 'waitlist', updated_at = ? WHERE id = ? AND status != 'waitlist'",
+                [(now, request["id"]) for request in waitlisted]
+            )
+            by_id = {request["id"]: request for request in requests}
+            record_events(conn, [
+                (allocation["request_id"], office_id, vehicle_type, "status_changed",
+                 by_id[allocation["request_id"]]["status"], "approved", {"slot_number": allocation["slot_number"]})
+                for allocation in allocations
+            ] + [
+                (request["id"], office_id, vehicle_type, "status_changed", "pending", "waitlist")
+                for request in waitlisted if request["status"] == "pending"
+            ])
+
+            # Shared slots count once against the office's availability
+            newly_held = len(slots_used - held)
+            conn.execute(
+                f"UPDATE offices SET available_{vehicle_type}_slots = MAX(0, available_{vehicle_type}_slots - ?) "
+                f"WHERE id = ?",
+                (newly_held, office_id)
+            )
+            for allocation in allocations:
+                request = by_id[allocation["request_id"]]
+                if request["email"]:
+                    enqueue(
+                        conn, "approval", request["email"], "Parking request approved",
+                        f"Hi {request['name']}, your parking request for {day} is approved. "
+                        f"Your slot is {allocation['slot_number']}."
+                    )
+
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Allocated {len(allocations)} of {len(requests)} request(s) for {day} "
+                f"({office_id}, {vehicle_type}) in {result['elapsed_ms']}ms")
+    return result
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import List, Dict, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL_SECONDS = 60
+ROLLUP_WATERMARK = "daily_utilisation.last_event_id"
+
+# Statuses that held a slot on the days they cover
+OCCUPYING_STATUSES = ("approved", "expired")
+
+# Guard against a bad date range exploding into millions of rollup days
+MAX_SPAN_DAYS = 366
+
+GROUPINGS = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "team": "team",
+    "shift": "shift",
+}
+
+# Archived requests are history too, so rollups read the unified view
+REQUEST_ROWS_QUERY = """
+    SELECT r.office_id, r.vehicle_type, r.status,
+           COALESCE(r.start_date, r.parking_date) AS first_day,
+           COALESCE(r.end_date, r.parking_date, r.start_date) AS last_day,
+           COALESCE(u.team, '') AS team, COALESCE(u.shift, '') AS shift
+    FROM all_parking_requests r
+    LEFT JOIN users u ON u.id = r.user_id
+    WHERE COALESCE(r.start_date, r.parking_date) IS NOT NULL
+"""
+
+
+def _to_day_numbers(values: List[str]):
+    import numpy as np
+    try:
+        return np.array([value[:10] for value in values], dtype="datetime64[D]").astype(np.int64)
+    except ValueError:
+        # Fall back per element so one malformed date does not sink the whole batch
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(np.datetime64(value[:10], "D").astype(np.int64))
+            except ValueError:
+                parsed.append(np.iinfo(np.int64).min)
+        return np.array(parsed, dtype=np.int64)
+
+
+def _factorize(values: List[str]):
+    import numpy as np
+    # Hash-based label encoding; np.unique on object arrays would sort Python strings
+    index = {}
+    inverse = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64, count=len(values))
+    return np.array(list(index), dtype=object), inverse
+
+
+def compute_daily_rollups(rows: List[Dict], day_from: Optional[str] = None,
+                          day_to: Optional[str] = None) -> List[tuple]:
+    """Expand requests into the days they cover and aggregate per day/office/type/team/shift.
+
+    Fully vectorised with NumPy so backfills over the whole table stay fast.
+    Returns ``(day, office_id, vehicle_type, team, shift, occupied, requested)`` tuples.
+    """
+    # NumPy is only needed for rollups; importing it lazily keeps it off the startup path
+    import numpy as np
+    if not rows:
+        return []
+
+    first = _to_day_numbers([row["first_day"] for row in rows])
+    last = _to_day_numbers([row["last_day"] or row["first_day"] for row in rows])
+    valid = first != np.iinfo(np.int64).min
+    last = np.where(last < first, first, last)
+    last = np.minimum(last, first + MAX_SPAN_DAYS - 1)
+
+    lengths = np.where(valid, last - first + 1, 0)
+    row_index = np.repeat(np.arange(len(rows)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    days = first[row_index] + np.arange(lengths.sum()) - starts
+
+    keep = np.ones(days.shape, dtype=bool)
+    if day_from:
+        keep &= days >= np.datetime64(day_from, "D").astype(np.int64)
+    if day_to:
+        keep &= days <= np.datetime64(day_to, "D").astype(np.int64)
+    days, row_index = days[keep], row_index[keep]
+    if days.size == 0:
+        return []
+
+    columns = {}
+    codes = []
+    for name in ("office_id", "vehicle_type", "team", "shift"):
+        labels, inverse = _factorize([row[name] for row in rows])
+        columns[name] = labels
+        codes.append(inverse[row_index])
+    occupying = np.array([row["status"] in OCCUPYING_STATUSES for row in rows])[row_index]
+
+    day_base = days.min()
+    dims = (int(days.max() - day_base + 1),) + tuple(len(columns[name]) for name in columns)
+    keys = np.ravel_multi_index((days - day_base, *codes), dims)
+    unique_keys, group = np.unique(keys, return_inverse=True)
+    requested = np.bincount(group)
+    occupied = np.bincount(group, weights=occupying).astype(np.int64)
+
+    day_codes, office_codes, type_codes, team_codes, shift_codes = np.unravel_index(unique_keys, dims)
+    day_labels = (day_codes + day_base).astype("datetime64[D]").astype(str)
+    return list(zip(
+        day_labels.tolist(),
+        columns["office_id"][office_codes].tolist(),
+        columns["vehicle_type"][type_codes].tolist(),
+        columns["team"][team_codes].tolist(),
+        columns["shift"][shift_codes].tolist(),
+        occupied.tolist(),
+        requested.tolist(),
+    ))
+
+
+def _write_rollups(conn, rollups: List[tuple]):
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO daily_utilisation
+            (day, office_id, vehicle_type, team, shift, occupied, requested)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        rollups
+    )
+
+
+def _set_watermark(conn, event_id: int):
+    conn.execute(
+        "INSERT OR REPLACE INTO job_state (name, value) VALUES (?, ?)",
+        (ROLLUP_WATERMARK, str(event_id))
+    )
+
+
+def backfill_rollups() -> int:
+    """Rebuild every rollup row from scratch. Returns the number of rows written."""
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        watermark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM request_events").fetchone()[0]
+        rows = [dict(row) for row in conn.execute(REQUEST_ROWS_QUERY).fetchall()]
+        rollups = compute_daily_rollups(rows)
+        conn.execute("DELETE FROM daily_utilisation")
+        _write_rollups(conn, rollups)
+        _set_watermark(conn, watermark)
+    logger.info(f"Backfilled {len(rollups)} daily utilisation row(s)")
+    return len(rollups)
+
+
+def refresh_rollups() -> int:
+    """Fold request events newer than the watermark into the rollups.
+
+    Only the days touched by changed requests are recomputed. Returns the
+    number of days refreshed.
+    """
+    state = db.execute_query("SELECT value FROM job_state WHERE name = ?", (ROLLUP_WATERMARK,))
+    if not state:
+        backfill_rollups()
+        return -1
+
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        watermark = int(conn.execute(
+            "SELECT value FROM job_state WHERE name = ?", (ROLLUP_WATERMARK,)
+        ).fetchone()["value"])
+        latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM request_events").fetchone()[0]
+        if latest <= watermark:
+            return 0
+
+        changed = [dict(row) for row in conn.execute(
+            f"""
+            {REQUEST_ROWS_QUERY}
+            AND r.id IN (SELECT DISTINCT request_id FROM request_events WHERE id > ? AND id <= ?)
+            """,
+            (watermark, latest)
+        ).fetchall()]
+        touched_days = sorted({rollup[0] for rollup in compute_daily_rollups(changed)})
+        if touched_days:
+            day_from, day_to = touched_days[0], touched_days[-1]
+            overlapping = [dict(row) for row in conn.execute(
+                f"""
+                {REQUEST_ROWS_QUERY}
+                AND COALESCE(r.start_date, r.parking_date) <= ?
+                AND COALESCE(r.end_date, r.parking_date, r.start_date) >= ?
+                """,
+                (day_to, day_from)
+            ).fetchall()]
+            touched = set(touched_days)
+            rollups = [rollup for rollup in compute_daily_rollups(overlapping, day_from, day_to)
+                       if rollup[0] in touched]
+            conn.executemany("DELETE FROM daily_utilisation WHERE day = ?", [(day,) for day in touched_days])
+            _write_rollups(conn, rollups)
+        _set_watermark(conn, latest)
+    return len(touched_days)
+
+
+def query_analytics(start: str, end: str, group_by: str = "day",
+                    office_id: Optional[str] = None, vehicle_type: Optional[str] = None) -> List[Dict]:
+    """Answer an occupancy range query from the rollups only."""
+    period = GROUPINGS[group_by]
+    clauses, params = ["day >= ?", "day <= ?"], [start, end]
+    if office_id:
+        clauses.append("office_id = ?")
+        params.append(office_id)
+    if vehicle_type:
+        clauses.append("vehicle_type = ?")
+        params.append(vehicle_type)
+
+    rows = db.execute_query(
+        f"""
+        SELECT {period} AS period, SUM(occupied) AS occupied, SUM(requested) AS requested
+        FROM daily_utilisation
+        WHERE {' AND '.join(clauses)}
+        GROUP BY period ORDER BY period
+        """,
+        tuple(params)
+    )
+
+    if group_by in ("day", "week"):
+        # Utilisation needs capacity, which only makes sense over calendar time
+        offices = db.execute_query(
+            "SELECT total_car_slots, total_bike_slots FROM offices" + (" WHERE id = ?" if office_id else ""),
+            (office_id,) if office_id else ()
+        )
+        daily_capacity = sum(
+            (office["total_car_slots"] if vehicle_type != "bike" else 0)
+            + (office["total_bike_slots"] if vehicle_type != "car" else 0)
+            for office in offices
+        )
+        days_in_period = {}
+        day = date.fromisoformat(start)
+        while day <= date.fromisoformat(end):
+            key = day.isoformat() if group_by == "day" else day.strftime("%Y-W%W")
+            days_in_period[key] = days_in_period.get(key, 0) + 1
+            day += timedelta(days=1)
+        for row in rows:
+            capacity = daily_capacity * days_in_period.get(row["period"], 0)
+            row["capacity"] = capacity
+            row["utilisation"] = round(row["occupied"] / capacity * 100, 1) if capacity else 0
+    return rows
+
+
+async def run_rollup_job(interval: float = ROLLUP_INTERVAL_SECONDS):
+    """Lifespan task keeping the rollups in step with the event log."""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_rollups)
+        except Exception:
+            logger.exception("Rollup refresh failed")
+        await asyncio.sleep(interval)
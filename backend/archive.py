@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from database import db, REQUEST_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Rejected and expired requests stay in the live table this long after their last change
+ARCHIVE_RETENTION_DAYS = 90
+CLOSED_STATUSES = ("rejected", "expired")
+
+# Rows moved per transaction; each batch holds the write lock only briefly
+ARCHIVE_BATCH_SIZE = 500
+# Pause between batches so queued writers get the lock in between
+ARCHIVE_BATCH_PAUSE_SECONDS = 0.05
+ARCHIVE_INTERVAL_SECONDS = 6 * 60 * 60
+
+# Running totals exposed through /api/admin/archive-stats
+archive_metrics = {
+    "runs": 0,
+    "requests_archived": 0,
+    "last_run_at": None,
+    "last_run_archived": 0,
+    "last_error": None,
+}
+
+
+def _archive_batch(cutoff: str, batch_size: int) -> int:
+    """Move one batch of closed requests last updated before ``cutoff`` into the archive."""
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Range seek per status on idx_parking_requests_status_updated
+        ids = [row["id"] for row in conn.execute(
+            f"""
+            SELECT id FROM parking_requests
+            WHERE status IN ({', '.join('?' for _ in CLOSED_STATUSES)}) AND updated_at < ?
+            LIMIT ?
+            """,
+            (*CLOSED_STATUSES, cutoff, batch_size)
+        )]
+        if not ids:
+            return 0
+
+        placeholders = ", ".join("?" for _ in ids)
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO parking_requests_archive ({REQUEST_COLUMNS}, archived_at)
+            SELECT {REQUEST_COLUMNS}, ? FROM parking_requests WHERE id IN ({placeholders})
+            """,
+            (datetime.now(timezone.utc).isoformat(), *ids)
+        )
+        conn.execute(f"DELETE FROM parking_requests WHERE id IN ({placeholders})", ids)
+        return len(ids)
+
+
+def archive_closed_requests(retention_days: int = ARCHIVE_RETENTION_DAYS,
+                            batch_size: int = ARCHIVE_BATCH_SIZE,
+                            max_batches: Optional[int] = None) -> int:
+    """Archive every closed request older than the retention window, batch by batch.
+
+    Returns the number of requests moved in this run.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+    archived = 0
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            moved = _archive_batch(cutoff, batch_size)
+            archived += moved
+            batches += 1
+            if moved < batch_size:
+                break
+            time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+        archive_metrics["last_error"] = None
+    except Exception as e:
+        archive_metrics["last_error"] = str(e)
+        logger.exception("Archival run failed")
+    finally:
+        archive_metrics["runs"] += 1
+        archive_metrics["requests_archived"] += archived
+        archive_metrics["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        archive_metrics["last_run_archived"] = archived
+
+    if archived:
+        logger.info(f"Archived {archived} closed request(s)")
+    return archived
+
+
+async def run_archiver(interval: float = ARCHIVE_INTERVAL_SECONDS):
+    """Lifespan task: archive once at startup and then on a fixed interval."""
+    while True:
+        await asyncio.to_thread(archive_closed_requests)
+        await asyncio.sleep(interval)
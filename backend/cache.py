@@ -0,0 +1,42 @@
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from database import db
+
+
+def table_version(table: str) -> int:
+    """Current change counter of ``table``; bumped by triggers on every write from any process."""
+    rows = db.execute_query("SELECT version FROM cache_versions WHERE name = ?", (table,))
+    return rows[0]["version"] if rows else 0
+
+
+class VersionedCache:
+    """Process-local cache whose entries are invalidated by the shared cache_versions counters.
+
+    Each read costs one primary-key lookup instead of the full query, and a
+    write made by any worker process invalidates every other worker's copy.
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, table: str, loader: Callable[[], Any]) -> Any:
+        # Read the version before loading so a concurrent write can only make us reload early
+        version = table_version(table)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] == version:
+            return entry[1]
+        value = loader()
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = VersionedCache()
@@ -0,0 +1,118 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from database import db
+
+# How long the writer waits for more work after the first unit arrives, and the batch cap
+BATCH_WINDOW_SECONDS = float(os.environ.get("WRITE_BATCH_WINDOW_MS", "2")) / 1000
+MAX_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_MAX", "64"))
+
+
+class WriteCoalescer:
+    """Group commit: units of work arriving close together share one transaction.
+
+    A unit is a callable taking a connection. Each runs inside its own
+    SAVEPOINT, so a unit that raises is rolled back alone and its caller
+    gets the exception, while the rest of the batch still commits. A
+    caller's future resolves only after the batch's COMMIT has returned,
+    so durability is exactly that of a commit per unit (synchronous is
+    left at SQLite's default); only the fsync is shared.
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_batch: int = MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {"units": 0, "batches": 0, "failed_units": 0, "failed_batches": 0, "largest_batch": 0}
+
+    def submit(self, unit: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue ``unit``; the returned future holds its result once committed."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def run(self, unit: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Blocking form of ``submit`` for code already running in a worker thread."""
+        return self.submit(unit).result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, name="write-coalescer", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer_loop(self):
+        while True:
+            batch = [(unit, future) for unit, future in self._collect() if future.set_running_or_notify_cancel()]
+            if batch:
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        outcomes = []
+        conn = None
+        try:
+            conn = db.connect()
+            conn.row_factory = sqlite3.Row
+            # Savepoints and the outer transaction are managed explicitly
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            for unit, future in batch:
+                conn.execute("SAVEPOINT unit")
+                try:
+                    outcomes.append((future, True, unit(conn)))
+                    conn.execute("RELEASE unit")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO unit")
+                    conn.execute("RELEASE unit")
+                    outcomes.append((future, False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing in the batch was committed; every caller sees the failure
+            self.stats["failed_batches"] += 1
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+
+        self.stats["batches"] += 1
+        self.stats["units"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                self.stats["failed_units"] += 1
+                future.set_exception(value)
+
+    def snapshot(self) -> Dict:
+        batches = self.stats["batches"]
+        return {**self.stats, "queued": self._queue.qsize(),
+                "avg_batch": round(self.stats["units"] / batches, 2) if batches else 0.0}
+
+
+write_coalescer = WriteCoalescer()
@@ -0,0 +1,115 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def _accepted_encodings(header: str) -> dict:
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str):
+    """Pick br when the client accepts it and brotli is installed, else gzip, else nothing."""
+    accepted = _accepted_encodings(accept_encoding or "")
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def _with_vary(headers: list) -> list:
+    """Add Accept-Encoding to Vary, keeping whatever other middleware (e.g. CORS) already put there."""
+    for i, (key, value) in enumerate(headers):
+        if key.decode("latin-1").lower() == "vary":
+            values = [part.strip().lower() for part in value.decode("latin-1").split(",")]
+            if "accept-encoding" not in values and "*" not in values:
+                headers[i] = (key, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression for responses above ``minimum_size`` bytes.
+
+    The app's responses are small, fully rendered JSON bodies, so the body
+    is buffered and compressed in one go.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((key.decode("latin-1").lower(), value.decode("latin-1")) for key, value in scope["headers"])
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            # Sent as is, but caches must still key on Accept-Encoding
+            async def identity_send(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": _with_vary(list(message["headers"]))}
+                await send(message)
+
+            await self.app(scope, receive, identity_send)
+            return
+
+        start_message = None
+        body = []
+
+        async def buffered_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await send_compressed(start_message, b"".join(body))
+
+        async def send_compressed(start, payload):
+            response_headers = [(key, value) for key, value in start["headers"]]
+            lowered = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in response_headers}
+            compressible = (
+                len(payload) >= self.minimum_size
+                and "content-encoding" not in lowered
+                and lowered.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            )
+            if compressible:
+                if encoding == "br":
+                    payload = brotli.compress(payload, quality=self.brotli_quality)
+                else:
+                    payload = gzip.compress(payload, compresslevel=self.gzip_level)
+                response_headers = [(key, value) for key, value in response_headers
+                                    if key.decode("latin-1").lower() != "content-length"]
+                response_headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(payload)).encode()),
+                ]
+            await send({**start, "headers": _with_vary(response_headers)})
+            await send({"type": "http.response.body", "body": payload})
+
+        await self.app(scope, receive, buffered_send)
@@ -1,16 +1,94 @@
 ﻿import sqlite3
 import json
+import os
+import threading
+from urllib.parse import quote
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from vehicles import normalize_vehicle_number, ACTIVE_STATUS_SQL
+from profiler import QueryProfiler, ProfilingConnection, SLOW_QUERY_MS
+
+# How long a connection waits on another process's write lock before "database is locked"
+BUSY_TIMEOUT_SECONDS = 30
+
+# Bump whenever init_database changes; stored in PRAGMA user_version so
+# an up-to-date database skips the DDL entirely on startup
+SCHEMA_VERSION = 7
+
+# Tables whose writes bump a row in cache_versions, for cross-process cache invalidation
+VERSIONED_TABLES = ('offices', 'users', 'parking_requests')
+
+# parking_requests columns, in table order; shared by the archive table and the unified view
+REQUEST_COLUMNS = (
+    'id, user_id, office_id, vehicle_type, vehicle_number, vehicle_number_norm, duration_type, '
+    'parking_date, start_date, end_date, recurring_pattern, description, status, slot_number, '
+    'approved_by, rejection_reason, created_at, updated_at'
+)
 
 class Database:
+    """SQLite storage engine backed by a file.
+
+    The rest of the backend only talks to storage through ``connect``,
+    ``transaction``, ``execute_query``, ``execute_update`` and
+    ``ensure_schema``; engines differ only in where the bytes live.
+    """
+    
     def __init__(self, db_path: str = 'parking.db'):
+        # Nothing touches the file until the first connection (or the app lifespan) needs it
         self.db_path = db_path
-        self.init_database()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # Set by enable_profiling; while None, connections are plain sqlite3 ones
+        self.profiler: Optional[QueryProfiler] = None
+    
+    def _sqlite_connect(self, target: str, **kwargs) -> sqlite3.Connection:
+        if self.profiler is None:
+            return sqlite3.connect(target, timeout=BUSY_TIMEOUT_SECONDS, **kwargs)
+        conn = sqlite3.connect(target, timeout=BUSY_TIMEOUT_SECONDS, factory=ProfilingConnection, **kwargs)
+        conn.profiler = self.profiler
+        return conn
+    
+    def _open(self) -> sqlite3.Connection:
+        return self._sqlite_connect(self.db_path)
+    
+    def enable_profiling(self, slow_query_ms: float = SLOW_QUERY_MS) -> QueryProfiler:
+        """Time every statement on connections opened from now on; keeps stats gathered so far."""
+        if self.profiler is None:
+            self.profiler = QueryProfiler(slow_query_ms)
+        self.profiler.slow_query_ms = slow_query_ms
+        return self.profiler
+    
+    def disable_profiling(self):
+        self.profiler = None
+    
+    def connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            self.ensure_schema()
+        return self._open()
+    
+    def ensure_schema(self):
+        """One-shot schema setup, skipped when PRAGMA user_version is already current."""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn = self._open()
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+            finally:
+                conn.close()
+            if version < SCHEMA_VERSION:
+                self.init_database()
+            self._schema_ready = True
     
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._open()
+        # WAL lets worker processes read while another one writes; it persists in the file
+        conn.execute("PRAGMA journal_mode=WAL")
         cursor = conn.cursor()
+        # Several workers may start at once; run the schema setup one at a time
+        cursor.execute("BEGIN IMMEDIATE")
         
         # Create offices table
         cursor.execute('''
@@ -49,6 +127,7 @@ class Database:
                 office_id TEXT NOT NULL,
                 vehicle_type TEXT NOT NULL,
                 vehicle_number TEXT NOT NULL,
+                vehicle_number_norm TEXT,
                 duration_type TEXT NOT NULL,
                 parking_date TEXT,
                 start_date TEXT,
@@ -66,11 +145,306 @@ class Database:
             )
         ''')
         
+        # Databases created before vehicle_number_norm existed get it added and backfilled
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(parking_requests)")]
+        if 'vehicle_number_norm' not in columns:
+            cursor.execute("ALTER TABLE parking_requests ADD COLUMN vehicle_number_norm TEXT")
+            conn.create_function('normalize_vehicle_number', 1, normalize_vehicle_number)
+            cursor.execute("UPDATE parking_requests SET vehicle_number_norm = normalize_vehicle_number(vehicle_number)")
+        
+        # Per-vehicle intervals of active bookings, sorted by first and last day, for
+        # conflict checks; expired and rejected bookings stay out of the scan
+        cursor.execute("DROP INDEX IF EXISTS idx_parking_requests_vehicle_interval")
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_vehicle_active
+            ON parking_requests (
+                vehicle_number_norm,
+                COALESCE(start_date, parking_date),
+                COALESCE(end_date, parking_date, start_date)
+            )
+            WHERE {ACTIVE_STATUS_SQL}
+        ''')
+        
+        # Expiry sweeper looks up approvals by the day they end on
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_status_end
+            ON parking_requests (status, COALESCE(end_date, parking_date))
+        ''')
+        # Archiver looks up closed requests by when they last changed
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_status_updated
+            ON parking_requests (status, updated_at)
+        ''')
+        
+        # Append-only history of request state changes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS request_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT NOT NULL,
+                office_id TEXT NOT NULL,
+                vehicle_type TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                from_status TEXT,
+                to_status TEXT NOT NULL,
+                payload TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_request_events_created_at
+            ON request_events (created_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_request_events_request
+            ON request_events (request_id, id)
+        ''')
+        
+        # Compacted state of each request, folded from events older than the last compaction
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS request_event_snapshots (
+                request_id TEXT PRIMARY KEY,
+                office_id TEXT NOT NULL,
+                vehicle_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                last_event_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Daily occupancy rollups backing /api/admin/analytics
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_utilisation (
+                day TEXT NOT NULL,
+                office_id TEXT NOT NULL,
+                vehicle_type TEXT NOT NULL,
+                team TEXT NOT NULL DEFAULT '',
+                shift TEXT NOT NULL DEFAULT '',
+                occupied INTEGER NOT NULL DEFAULT 0,
+                requested INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, office_id, vehicle_type, team, shift)
+            )
+        ''')
+        
+        # Progress markers for background jobs (e.g. last event folded into rollups)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_state (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        
+        # Stored responses for client retries carrying an Idempotency-Key header
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                request_hash TEXT NOT NULL,
+                status_code INTEGER,
+                response_body TEXT,
+                created_at TEXT NOT NULL,
+                claimed_at TEXT,
+                expires_at TEXT NOT NULL,
+                PRIMARY KEY (key, endpoint)
+            )
+        ''')
+        # Claim lease for in-flight keys, so a retry can take over from a crashed owner
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(idempotency_keys)")]
+        if 'claimed_at' not in columns:
+            cursor.execute("ALTER TABLE idempotency_keys ADD COLUMN claimed_at TEXT")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+            ON idempotency_keys (expires_at)
+        ''')
+        
+        # Transactional outbox drained by the notification dispatcher
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                sent_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+            ON notification_outbox (status, next_attempt_at)
+        ''')
+        
+        # Per-table change counters, bumped by triggers so every process sees every write
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        for table in VERSIONED_TABLES:
+            cursor.execute(
+                "INSERT OR IGNORE INTO cache_versions (name, version, updated_at) "
+                "VALUES (?, 0, strftime('%Y-%m-%dT%H:%M:%f', 'now'))",
+                (table,)
+            )
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version
+                    AFTER {operation} ON {table}
+                    BEGIN
+                        UPDATE cache_versions
+                        SET version = version + 1, updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')
+                        WHERE name = '{table}';
+                    END
+                ''')
+        
+        # One-time codes shared by all worker processes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS otp_codes (
+                email TEXT PRIMARY KEY,
+                otp TEXT NOT NULL,
+                expires_at TEXT NOT NULL
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_user
+            ON parking_requests (user_id)
+        ''')
+        
+        # Full-text index over requests and their owners. FTS rows are keyed by
+        # request_search_docs.docid, an INTEGER PRIMARY KEY that VACUUM keeps;
+        # the implicit rowid of parking_requests (TEXT primary key) it may renumber.
+        if not cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'request_search_docs'"
+        ).fetchone():
+            # Indexes built before the docid table were keyed on that rowid; rebuild them
+            for trigger in ('insert', 'update', 'delete'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_parking_requests_search_{trigger}")
+            cursor.execute("DROP TRIGGER IF EXISTS trg_users_search_update")
+            cursor.execute("DROP TABLE IF EXISTS request_search")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS request_search_docs (
+                docid INTEGER PRIMARY KEY,
+                request_id TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS request_search USING fts5 (
+                request_id UNINDEXED,
+                user_name,
+                email,
+                emp_id,
+                team,
+                vehicle_number,
+                description,
+                prefix = '2 3'
+            )
+        ''')
+        search_row = '''
+            SELECT d.docid, p.id, u.name, u.email, u.emp_id, u.team,
+                   p.vehicle_number || ' ' || COALESCE(p.vehicle_number_norm, ''), p.description
+            FROM parking_requests p
+            JOIN request_search_docs d ON d.request_id = p.id
+            LEFT JOIN users u ON u.id = p.user_id
+        '''
+        search_insert = '''
+            INSERT INTO request_search
+                (rowid, request_id, user_name, email, emp_id, team, vehicle_number, description)
+        '''
+        search_docid = "(SELECT docid FROM request_search_docs WHERE request_id = OLD.id)"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_parking_requests_search_insert
+            AFTER INSERT ON parking_requests
+            BEGIN
+                INSERT OR IGNORE INTO request_search_docs (request_id) VALUES (NEW.id);
+                {search_insert} {search_row} WHERE p.id = NEW.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_parking_requests_search_update
+            AFTER UPDATE OF user_id, vehicle_number, vehicle_number_norm, description ON parking_requests
+            BEGIN
+                DELETE FROM request_search WHERE rowid = {search_docid};
+                {search_insert} {search_row} WHERE p.id = NEW.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_parking_requests_search_delete
+            AFTER DELETE ON parking_requests
+            BEGIN
+                DELETE FROM request_search WHERE rowid = {search_docid};
+                DELETE FROM request_search_docs WHERE request_id = OLD.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_users_search_update
+            AFTER UPDATE OF name, email, emp_id, team ON users
+            BEGIN
+                DELETE FROM request_search WHERE rowid IN (
+                    SELECT d.docid FROM parking_requests p JOIN request_search_docs d ON d.request_id = p.id
+                    WHERE p.user_id = NEW.id
+                );
+                {search_insert} {search_row} WHERE p.user_id = NEW.id;
+            END
+        ''')
+        # Index requests written before the search table existed
+        cursor.execute("INSERT OR IGNORE INTO request_search_docs (request_id) SELECT id FROM parking_requests")
+        cursor.execute(f'''
+            {search_insert} {search_row}
+            WHERE d.docid NOT IN (SELECT rowid FROM request_search)
+        ''')
+        
+        # Closed requests past the retention window move here (see archive.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS parking_requests_archive (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                office_id TEXT NOT NULL,
+                vehicle_type TEXT NOT NULL,
+                vehicle_number TEXT NOT NULL,
+                vehicle_number_norm TEXT,
+                duration_type TEXT NOT NULL,
+                parking_date TEXT,
+                start_date TEXT,
+                end_date TEXT,
+                recurring_pattern TEXT,
+                description TEXT,
+                status TEXT,
+                slot_number TEXT,
+                approved_by TEXT,
+                rejection_reason TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_archive_status
+            ON parking_requests_archive (status)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_parking_requests_archive_user
+            ON parking_requests_archive (user_id)
+        ''')
+        # Live and archived requests together, for history and analytics
+        cursor.execute(f'''
+            CREATE VIEW IF NOT EXISTS all_parking_requests AS
+            SELECT {REQUEST_COLUMNS}, NULL AS archived_at FROM parking_requests
+            UNION ALL
+            SELECT {REQUEST_COLUMNS}, archived_at FROM parking_requests_archive
+        ''')
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
         conn.close()
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connect()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute(query, params)
@@ -79,12 +453,71 @@ class Database:
         return results
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connect()
         cursor = conn.cursor()
         cursor.execute(query, params)
         conn.commit()
         conn.close()
         return cursor.rowcount
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one connection and commit them together."""
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+class MemoryDatabase(Database):
+    """The same schema and SQL as Database, kept in RAM.
+
+    Uses SQLite's memdb VFS: every connection to the same ``db_path`` in
+    this process shares one in-memory database with normal locking and
+    busy timeouts, so triggers, FTS and concurrent writers behave exactly
+    as on disk. One connection is held open per path to keep it alive
+    until ``close()``.
+    """
+    
+    def __init__(self, db_path: str = 'parking.db'):
+        super().__init__(db_path)
+        self._keepers: Dict[str, sqlite3.Connection] = {}
+        self._keepers_lock = threading.Lock()
+    
+    def _open(self) -> sqlite3.Connection:
+        uri = f"file:{quote('/' + self.db_path.lstrip('/'))}?vfs=memdb"
+        if self.db_path not in self._keepers:
+            with self._keepers_lock:
+                if self.db_path not in self._keepers:
+                    self._keepers[self.db_path] = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._sqlite_connect(uri, uri=True)
+    
+    def close(self):
+        """Drop every in-memory database this engine created."""
+        with self._keepers_lock:
+            for conn in self._keepers.values():
+                conn.close()
+            self._keepers.clear()
+        self._schema_ready = False
+
+# DB_TYPE values accepted by create_database
+ENGINES = {'sqlite': Database, 'memory': MemoryDatabase}
+
+def create_database(db_type: str = None, db_path: str = None) -> Database:
+    """Build the storage engine named by ``db_type`` (default: $DB_TYPE, else sqlite)."""
+    db_type = (db_type or os.environ.get('DB_TYPE') or 'sqlite').lower()
+    if db_type not in ENGINES:
+        raise ValueError(f"Unknown DB_TYPE {db_type!r}; expected one of {', '.join(ENGINES)}")
+    database = ENGINES[db_type](db_path or os.environ.get('DB_PATH') or 'parking.db')
+    # DB_PROFILE=1 turns the query profiler on from startup
+    if os.environ.get('DB_PROFILE', '').lower() in ('1', 'true', 'yes'):
+        database.enable_profiling(float(os.environ.get('DB_SLOW_QUERY_MS') or SLOW_QUERY_MS))
+    return database
 
-# Global database instance
-db = Database()
+# Global database instance, chosen by DB_TYPE / DB_PATH
+db = create_database()
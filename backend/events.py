@@ -0,0 +1,155 @@
+import json
+import logging
+from datetime import datetime, timezone
+from enum import Enum
+from typing import List, Dict, Optional, Iterable
+
+from analytics import ROLLUP_WATERMARK
+from database import db
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = "request_id, office_id, vehicle_type, event_type, from_status, to_status, payload, created_at"
+
+
+def _plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _event_row(request_id, office_id, vehicle_type, event_type, from_status, to_status, payload=None):
+    return (
+        request_id, office_id, _plain(vehicle_type), event_type,
+        _plain(from_status), _plain(to_status),
+        json.dumps(payload) if payload is not None else None,
+        datetime.now(timezone.utc).isoformat()
+    )
+
+
+def record_event(conn, request_id: str, office_id: str, vehicle_type: str, event_type: str,
+                 from_status: Optional[str], to_status: str, payload: Optional[dict] = None):
+    """Append one event on ``conn`` so it commits with the change it describes."""
+    conn.execute(
+        f"INSERT INTO request_events ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        _event_row(request_id, office_id, vehicle_type, event_type, from_status, to_status, payload)
+    )
+
+
+def record_events(conn, events: Iterable[tuple]):
+    """Bulk variant of record_event; each item is record_event's positional arguments."""
+    conn.executemany(
+        f"INSERT INTO request_events ({EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [_event_row(*event) for event in events]
+    )
+
+
+def get_events(start: Optional[str] = None, end: Optional[str] = None,
+               request_id: Optional[str] = None, limit: int = 500) -> List[Dict]:
+    """Range scan over the event log by time, optionally for a single request."""
+    clauses, params = [], []
+    if request_id:
+        clauses.append("request_id = ?")
+        params.append(request_id)
+    if start:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end:
+        clauses.append("created_at < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    events = db.execute_query(
+        f"SELECT * FROM request_events {where} ORDER BY created_at, id LIMIT ?",
+        tuple(params) + (limit,)
+    )
+    for event in events:
+        if event["payload"]:
+            event["payload"] = json.loads(event["payload"])
+    return events
+
+
+def _seed_snapshots(conn):
+    # Requests written before the event log existed only have their current row
+    conn.execute("""
+        INSERT OR IGNORE INTO request_event_snapshots
+            (request_id, office_id, vehicle_type, status, last_event_id, updated_at)
+        SELECT id, office_id, vehicle_type, status, 0, updated_at FROM parking_requests
+        WHERE NOT EXISTS (SELECT 1 FROM request_events e WHERE e.request_id = parking_requests.id)
+    """)
+
+
+def compact_events(before: str) -> Dict:
+    """Fold events older than ``before`` into per-request snapshots and drop them.
+
+    Events the rollup job has not consumed yet are kept, whatever their age.
+    """
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _seed_snapshots(conn)
+        watermark = conn.execute(
+            "SELECT MAX(id) FROM request_events WHERE created_at < ?", (before,)
+        ).fetchone()[0]
+        # refresh_rollups still needs every event past its own watermark
+        rolled_up = conn.execute(
+            "SELECT value FROM job_state WHERE name = ?", (ROLLUP_WATERMARK,)
+        ).fetchone()
+        if watermark is not None and rolled_up is not None:
+            watermark = min(watermark, int(rolled_up["value"]))
+        if not watermark:
+            return {"compacted_events": 0, "snapshots": 0}
+
+        # Bare columns next to MAX(id) come from the latest event of each request
+        snapshots = conn.execute("""
+            INSERT OR REPLACE INTO request_event_snapshots
+                (request_id, office_id, vehicle_type, status, last_event_id, updated_at)
+            SELECT request_id, office_id, vehicle_type, to_status, MAX(id), created_at
+            FROM request_events WHERE id <= ?
+            GROUP BY request_id
+        """, (watermark,)).rowcount
+        compacted = conn.execute("DELETE FROM request_events WHERE id <= ?", (watermark,)).rowcount
+
+    logger.info(f"Compacted {compacted} request event(s) into {snapshots} snapshot(s)")
+    return {"compacted_events": compacted, "snapshots": snapshots}
+
+
+def rebuild_office_availability() -> List[Dict]:
+    """Recompute every office's available slots from snapshots plus newer events."""
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _seed_snapshots(conn)
+        held = conn.execute("""
+            WITH latest AS (
+                SELECT request_id, office_id, vehicle_type, to_status AS status, MAX(id)
+                FROM request_events GROUP BY request_id
+            ),
+            current AS (
+                SELECT request_id, office_id, vehicle_type, status FROM latest
+                UNION ALL
+                SELECT request_id, office_id, vehicle_type, status FROM request_event_snapshots
+                WHERE request_id NOT IN (SELECT request_id FROM latest)
+            )
+            -- Shifts sharing a slot hold it once
+            SELECT c.office_id, c.vehicle_type, COUNT(DISTINCT COALESCE(p.slot_number, c.request_id)) AS held
+            FROM current c LEFT JOIN parking_requests p ON p.id = c.request_id
+            WHERE c.status = 'approved'
+            GROUP BY c.office_id, c.vehicle_type
+        """).fetchall()
+
+        held_by_office = {}
+        for row in held:
+            held_by_office.setdefault(row["office_id"], {})[row["vehicle_type"]] = row["held"]
+
+        offices = conn.execute("SELECT * FROM offices").fetchall()
+        results = []
+        for office in offices:
+            office_held = held_by_office.get(office["id"], {})
+            available_car = max(0, office["total_car_slots"] - office_held.get("car", 0))
+            available_bike = max(0, office["total_bike_slots"] - office_held.get("bike", 0))
+            conn.execute(
+                "UPDATE offices SET available_car_slots = ?, available_bike_slots = ? WHERE id = ?",
+                (available_car, available_bike, office["id"])
+            )
+            results.append({
+                "office_id": office["id"],
+                "available_car_slots": available_car,
+                "available_bike_slots": available_bike
+            })
+    return results
@@ -0,0 +1,78 @@
+import hashlib
+from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Sequence, Any
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database import db
+
+# Browsers may keep the response but must revalidate it (cheaply, via ETag) before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def table_versions(tables: Sequence[str]) -> Dict[str, Dict]:
+    """Change counters for ``tables`` in a single primary-key lookup."""
+    rows = db.execute_query(
+        f"SELECT name, version, updated_at FROM cache_versions WHERE name IN ({', '.join('?' for _ in tables)})",
+        tuple(tables)
+    )
+    return {row["name"]: row for row in rows}
+
+
+def _validators(tables: Sequence[str]):
+    versions = table_versions(tables)
+    fingerprint = ";".join(f"{table}={versions[table]['version']}" if table in versions else table
+                           for table in sorted(tables))
+    etag = f'W/"{hashlib.sha1(fingerprint.encode()).hexdigest()[:16]}"'
+    last_modified = max(
+        (datetime.fromisoformat(row["updated_at"]).replace(tzinfo=timezone.utc) for row in versions.values()),
+        default=datetime(1970, 1, 1, tzinfo=timezone.utc)
+    )
+    return etag, last_modified
+
+
+def _http_date(last_modified: datetime) -> datetime:
+    """Whole-second date to advertise for a full-precision ``last_modified``.
+
+    HTTP dates drop sub-second precision. Rounding up is only safe once
+    that second has passed, since any later write then lands at or after
+    it; until then round down, which never validates (see _not_modified).
+    """
+    floor = last_modified.replace(microsecond=0)
+    ceiling = floor + timedelta(seconds=1) if last_modified.microsecond else floor
+    return ceiling if ceiling <= datetime.now(timezone.utc) else floor
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            # Strict, against full precision: a change within the advertised second is never hidden
+            return last_modified < parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_response(request: Request, tables: Sequence[str], build: Callable[[], Any]) -> Response:
+    """Serve ``build()`` with ETag/Last-Modified derived from the tables it reads.
+
+    When the client already has the current version, answer 304 without
+    running ``build`` at all: no queries beyond the version lookup and no
+    serialisation.
+    """
+    etag, last_modified = _validators(tables)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(_http_date(last_modified), usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(build()), headers=headers)
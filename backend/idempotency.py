@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# An in-flight key whose owner has not finished within this long is presumed crashed
+CLAIM_LEASE = timedelta(seconds=60)
+MAX_IDEMPOTENCY_KEYS = 10000
+CLEANUP_INTERVAL_SECONDS = 10 * 60
+
+
+class IdempotencyError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _hash_payload(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _stored_response(stored, request_hash: str) -> Optional[Dict[str, Any]]:
+    if stored["request_hash"] != request_hash:
+        raise IdempotencyError(422, "Idempotency-Key was already used with a different request body")
+    if stored["status_code"] is None:
+        return None
+    return {"status_code": stored["status_code"], "body": json.loads(stored["response_body"])}
+
+
+def lookup(key: str, endpoint: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Read-only check for a completed response to replay, without claiming the key.
+
+    Lets replays skip admission control and other work done before ``begin``.
+    Raises IdempotencyError if the key was used with a different payload.
+    """
+    stored = db.execute_query(
+        "SELECT * FROM idempotency_keys WHERE key = ? AND endpoint = ? AND expires_at >= ?",
+        (key, endpoint, datetime.now(timezone.utc).isoformat())
+    )
+    return _stored_response(stored[0], _hash_payload(payload)) if stored else None
+
+
+def begin(key: str, endpoint: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Claim ``key`` for this request.
+
+    Returns None when the caller should do the work, or the stored
+    ``{"status_code", "body"}`` when the key was already completed.
+    Raises IdempotencyError if the key is in flight or reused with a different payload.
+    An in-flight claim older than CLAIM_LEASE is taken over instead.
+    """
+    now = datetime.now(timezone.utc)
+    request_hash = _hash_payload(payload)
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "DELETE FROM idempotency_keys WHERE key = ? AND endpoint = ? AND expires_at < ?",
+            (key, endpoint, now.isoformat())
+        )
+        claimed = conn.execute(
+            """
+            INSERT OR IGNORE INTO idempotency_keys (key, endpoint, request_hash, created_at, claimed_at, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (key, endpoint, request_hash, now.isoformat(), now.isoformat(), (now + IDEMPOTENCY_TTL).isoformat())
+        ).rowcount
+        if claimed:
+            return None
+        stored = conn.execute(
+            "SELECT * FROM idempotency_keys WHERE key = ? AND endpoint = ?", (key, endpoint)
+        ).fetchone()
+        replay = _stored_response(stored, request_hash)
+        if replay is not None:
+            return replay
+
+        # Keys claimed before the lease column existed count from created_at
+        if (stored["claimed_at"] or stored["created_at"]) >= (now - CLAIM_LEASE).isoformat():
+            raise IdempotencyError(409, "A request with this Idempotency-Key is still being processed")
+        conn.execute(
+            "UPDATE idempotency_keys SET claimed_at = ? WHERE key = ? AND endpoint = ?",
+            (now.isoformat(), key, endpoint)
+        )
+        logger.warning(f"Took over stale Idempotency-Key claim for {endpoint}")
+        return None
+
+
+def complete(key: str, endpoint: str, status_code: int, body: Any):
+    db.execute_update(
+        "UPDATE idempotency_keys SET status_code = ?, response_body = ? WHERE key = ? AND endpoint = ?",
+        (status_code, json.dumps(body), key, endpoint)
+    )
+
+
+def abandon(key: str, endpoint: str):
+    """Release a claimed key after a failure so the client can retry it."""
+    db.execute_update(
+        "DELETE FROM idempotency_keys WHERE key = ? AND endpoint = ? AND status_code IS NULL",
+        (key, endpoint)
+    )
+
+
+def purge_expired() -> int:
+    """Drop expired keys, then the oldest ones beyond MAX_IDEMPOTENCY_KEYS."""
+    removed = db.execute_update(
+        "DELETE FROM idempotency_keys WHERE expires_at < ?",
+        (datetime.now(timezone.utc).isoformat(),)
+    )
+    removed += db.execute_update(
+        """
+        DELETE FROM idempotency_keys WHERE rowid IN (
+            SELECT rowid FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?
+        )
+        """,
+        (MAX_IDEMPOTENCY_KEYS,)
+    )
+    return removed
+
+
+async def run_idempotency_cleanup(interval: float = CLEANUP_INTERVAL_SECONDS):
+    """Lifespan task enforcing the TTL and size bound of the key table."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(purge_expired)
+            if removed:
+                logger.info(f"Purged {removed} idempotency key(s)")
+        except Exception:
+            logger.exception("Idempotency key cleanup failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import smtplib
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from typing import List, Dict, Optional
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_CONCURRENCY = 5
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+POLL_INTERVAL_SECONDS = 5
+
+# A claimed message that is not settled within this window is picked up again
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(conn, kind: str, recipient: str, subject: str, body: str):
+    """Queue a message on ``conn`` so it is only sent if the surrounding change commits."""
+    now = _now().isoformat()
+    conn.execute(
+        """
+        INSERT INTO notification_outbox (kind, recipient, subject, body, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (kind, recipient, subject, body, now, now)
+    )
+
+
+class LogSender:
+    """Default sender when no SMTP server is configured: just logs the message."""
+
+    async def send(self, message: Dict):
+        print(f"📧 {message['kind']} for {message['recipient']}: {message['body']}")
+
+
+class SMTPSender:
+    def __init__(self, host: str, port: int = 25, from_addr: str = "noreply@parkingsystem.com",
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def _send_sync(self, message: Dict):
+        email = EmailMessage()
+        email["From"] = self.from_addr
+        email["To"] = message["recipient"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, message: Dict):
+        await asyncio.to_thread(self._send_sync, message)
+
+
+def sender_from_env():
+    host = os.environ.get("SMTP_HOST")
+    if not host:
+        return LogSender()
+    return SMTPSender(
+        host,
+        int(os.environ.get("SMTP_PORT", "25")),
+        from_addr=os.environ.get("SMTP_FROM", "noreply@parkingsystem.com"),
+        username=os.environ.get("SMTP_USERNAME"),
+        password=os.environ.get("SMTP_PASSWORD"),
+        use_tls=os.environ.get("SMTP_STARTTLS", "").lower() in ("1", "true", "yes"),
+    )
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+class NotificationDispatcher:
+    """Drains the outbox in batches with bounded concurrency and exponential backoff."""
+
+    def __init__(self, sender=None, batch_size: int = BATCH_SIZE, max_concurrency: int = MAX_CONCURRENCY,
+                 max_attempts: int = MAX_ATTEMPTS, poll_interval: float = POLL_INTERVAL_SECONDS):
+        self.sender = sender or sender_from_env()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Skip the rest of the poll interval, e.g. right after enqueueing."""
+        self._wakeup.set()
+
+    def claim_batch(self) -> List[Dict]:
+        now = _now()
+        with db.transaction() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = [dict(row) for row in conn.execute(
+                """
+                SELECT * FROM notification_outbox
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+                """,
+                (now.isoformat(), self.batch_size)
+            ).fetchall()]
+            conn.executemany(
+                "UPDATE notification_outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+                [((now + CLAIM_LEASE).isoformat(), row["id"]) for row in rows]
+            )
+        return rows
+
+    async def _deliver(self, message: Dict):
+        async with self._semaphore:
+            try:
+                await self.sender.send(message)
+                return None
+            except Exception as e:
+                return e
+
+    def _settle(self, batch: List[Dict], errors: List[Optional[Exception]]):
+        now = _now()
+        sent, retries = [], []
+        for message, error in zip(batch, errors):
+            if error is None:
+                sent.append((now.isoformat(), message["id"]))
+                continue
+            attempts = message["attempts"] + 1
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            retries.append((status, attempts, (now + backoff_delay(attempts)).isoformat(), str(error), message["id"]))
+            logger.warning(f"Notification {message['id']} to {message['recipient']} failed (attempt {attempts}): {error}")
+        with db.transaction() as conn:
+            conn.executemany(
+                "UPDATE notification_outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                sent
+            )
+            conn.executemany(
+                """
+                UPDATE notification_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                retries
+            )
+
+    async def dispatch_once(self) -> int:
+        """Send one batch of due messages. Returns how many were attempted."""
+        batch = await asyncio.to_thread(self.claim_batch)
+        if not batch:
+            return 0
+        errors = await asyncio.gather(*(self._deliver(message) for message in batch))
+        await asyncio.to_thread(self._settle, batch, errors)
+        return len(batch)
+
+    async def run(self):
+        """Lifespan task: keep draining, sleeping between empty polls."""
+        while True:
+            try:
+                attempted = await self.dispatch_once()
+            except Exception:
+                logger.exception("Notification dispatch failed")
+                attempted = 0
+            if attempted < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+
+def outbox_stats() -> Dict[str, int]:
+    rows = db.execute_query("SELECT status, COUNT(*) AS count FROM notification_outbox GROUP BY status")
+    return {row["status"]: row["count"] for row in rows}
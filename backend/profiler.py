@@ -0,0 +1,163 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = 100.0
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+# The app issues a small, fixed set of statement texts, so fingerprints are cached
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Statement shape with literals and IN-list lengths folded, so variants share one entry."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryProfiler:
+    """Per-fingerprint call counts, timings and row counts for one process.
+
+    Time covers executing the statement and fetching its rows. A statement
+    whose total crosses ``slow_query_ms`` is logged once with its
+    EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, elapsed_ms: float, rows: int, statement_ms: float, calls: int = 0):
+        """Add one execute or fetch step; ``statement_ms`` is the execution's running total."""
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {"statement": key, "calls": 0, "total_ms": 0.0,
+                                            "max_ms": 0.0, "rows": 0, "slow_calls": 0}
+            entry["calls"] += calls
+            entry["total_ms"] += elapsed_ms
+            entry["rows"] += rows
+            entry["max_ms"] = max(entry["max_ms"], statement_ms)
+
+    def slow(self, key: str):
+        with self._lock:
+            self._stats[key]["slow_calls"] += 1
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[Dict]:
+        with self._lock:
+            entries = [dict(entry) for entry in self._stats.values()]
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0
+            for field in ("total_ms", "max_ms", "avg_ms"):
+                entry[field] = round(entry[field], 3)
+        return sorted(entries, key=lambda entry: entry[order_by], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    _key: Optional[str] = None
+    _sql: Optional[str] = None
+    _params = ()
+    _elapsed_ms = 0.0
+    _logged = False
+
+    def execute(self, sql, parameters=()):
+        return self._run(sql, parameters, super().execute, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(sql, None, super().executemany, seq_of_parameters)
+
+    def _run(self, sql, parameters, run, arguments):
+        self._key, self._sql, self._params = fingerprint(sql), sql, parameters
+        self._elapsed_ms, self._logged = 0.0, False
+        started = time.perf_counter()
+        try:
+            return run(sql, arguments)
+        finally:
+            # Writes report their row count now; reads count rows as they are fetched
+            changed = self.rowcount if self.description is None and self.rowcount > 0 else 0
+            self._step(started, changed, calls=1)
+
+    def _step(self, started: float, rows: int, calls: int = 0):
+        elapsed = (time.perf_counter() - started) * 1000
+        self._elapsed_ms += elapsed
+        profiler = self.connection.profiler
+        profiler.record(self._key, elapsed, rows, self._elapsed_ms, calls)
+        if not self._logged and self._elapsed_ms >= profiler.slow_query_ms:
+            self._logged = True
+            profiler.slow(self._key)
+            self._log_slow()
+
+    def _log_slow(self):
+        plan = []
+        if self._params is not None:
+            try:
+                # A plain cursor, so the plan lookup is not profiled itself
+                plan = [row[-1] for row in sqlite3.Cursor(self.connection).execute(
+                    f"EXPLAIN QUERY PLAN {self._sql}", self._params
+                )]
+            except sqlite3.Error:
+                pass
+        logger.warning(
+            f"Slow query ({self._elapsed_ms:.1f}ms): {self._key}"
+            + "".join(f"\n    {step}" for step in plan)
+        )
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._step(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._step(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._step(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._step(started, 0)
+            raise
+        self._step(started, 1)
+        return row
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection whose cursors report to ``profiler``; only used while profiling is on."""
+
+    profiler: QueryProfiler
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
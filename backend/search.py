@@ -0,0 +1,49 @@
+import re
+from typing import Dict, Optional
+
+from database import db
+
+# bm25 column weights, in request_search column order (request_id is unindexed)
+COLUMN_WEIGHTS = (0.0, 10.0, 5.0, 8.0, 2.0, 8.0, 1.0)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Quoting each token keeps user input from being parsed as FTS5 syntax, so
+    "TN-09" or "o'brien" are safe to pass straight through.
+    """
+    tokens = _TOKEN.findall(text or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_requests(text: str, limit: int = 20, offset: int = 0) -> Dict:
+    match = build_match_query(text)
+    if not match:
+        return {"query": text, "total": 0, "results": []}
+
+    weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+    total = db.execute_query(
+        "SELECT COUNT(*) AS total FROM request_search WHERE request_search MATCH ?", (match,)
+    )[0]["total"]
+    results = db.execute_query(
+        f"""
+        SELECT p.id, p.status, p.vehicle_type, p.vehicle_number, p.duration_type,
+               p.parking_date, p.start_date, p.end_date, p.description, p.slot_number, p.created_at,
+               s.user_name, s.email AS user_email, s.emp_id, s.team,
+               o.name AS office_name,
+               bm25(request_search, {weights}) AS score
+        FROM request_search s
+        JOIN parking_requests p ON p.id = s.request_id
+        LEFT JOIN offices o ON o.id = p.office_id
+        WHERE request_search MATCH ?
+        ORDER BY score
+        LIMIT ? OFFSET ?
+        """,
+        (match, limit, offset)
+    )
+    return {"query": text, "total": total, "results": results}
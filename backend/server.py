@@ -1,30 +1,73 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status, BackgroundTasks
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, status, Header, Request, Query
+from fastapi.security import HTTPBearer
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-import json
-import tempfile
-import io
 import random
 import string
+import math
+import asyncio
+from contextlib import asynccontextmanager
+
+ROOT_DIR = Path(__file__).parent
+# Loaded before the database import: DB_TYPE / DB_PATH pick the storage engine
+load_dotenv(ROOT_DIR / '.env')
 
 # Import our SQLite database
 from database import db
+from sweeper import run_expiry_sweeper, sweeper_metrics
+from archive import run_archiver, archive_metrics, archive_closed_requests, ARCHIVE_RETENTION_DAYS, CLOSED_STATUSES
+from events import record_event, get_events, compact_events, rebuild_office_availability
+from analytics import run_rollup_job, query_analytics, backfill_rollups, GROUPINGS
+from vehicles import normalize_vehicle_number, booking_interval, find_vehicle_conflict
+from cache import cache
+from search import search_requests
+from http_cache import conditional_response
+from compression import CompressionMiddleware
+from admission import AdmissionController, AdmissionRejected
+from coalescer import write_coalescer
+from allocation import allocate_day, next_free_slot, release_slot
+from notifications import NotificationDispatcher, enqueue as enqueue_notification, outbox_stats
+from idempotency import (
+    IdempotencyError, run_idempotency_cleanup,
+    begin as begin_idempotent, complete as complete_idempotent, abandon as abandon_idempotent,
+    lookup as lookup_idempotent
+)
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Startup work and background tasks that live as long as the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("🚀 Starting Parking Management System...")
+    # Schema setup happens here once, not at import time
+    await asyncio.to_thread(db.ensure_schema)
+    initialize_default_office()
+    # BACKGROUND_JOBS=0 leaves the periodic jobs to someone else (tests call them directly)
+    background_tasks = [
+        asyncio.create_task(run_expiry_sweeper()),
+        asyncio.create_task(run_archiver()),
+        asyncio.create_task(run_rollup_job()),
+        asyncio.create_task(run_idempotency_cleanup()),
+        asyncio.create_task(notification_dispatcher.run()),
+    ] if os.environ.get("BACKGROUND_JOBS", "1").lower() not in ("0", "false", "no") else []
+    print("✅ Startup completed!")
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # FIXED: Add CORS middleware RIGHT AFTER creating the app (BEFORE the router)
 app.add_middleware(
@@ -36,6 +79,9 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Negotiated gzip/brotli for large responses such as the request listings
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -52,6 +98,14 @@ class RequestStatus(str, Enum):
     APPROVED = "approved"
     REJECTED = "rejected"
     WAITLIST = "waitlist"
+    EXPIRED = "expired"
+
+# Statuses an admin may set; expiry is left to the sweeper, which also frees the slot
+class ApprovalStatus(str, Enum):
+    PENDING = "pending"
+    APPROVED = "approved"
+    REJECTED = "rejected"
+    WAITLIST = "waitlist"
 
 class UserRole(str, Enum):
     USER = "user"
@@ -141,9 +195,21 @@ class AdminLogin(BaseModel):
 
 class AdminApproval(BaseModel):
     request_id: str
-    status: RequestStatus
+    status: ApprovalStatus
     rejection_reason: Optional[str] = None
 
+class AllocationRun(BaseModel):
+    date: str
+    office_id: str = "default-office"
+    vehicle_type: VehicleType
+    dry_run: bool = False
+    history_days: int = Field(30, ge=0, le=365)
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    slow_query_ms: float = Field(100.0, ge=0)
+    reset: bool = False
+
 class OTPRequest(BaseModel):
     email: str
 
@@ -155,16 +221,21 @@ class UserStatusRequest(BaseModel):
     email: str
     otp: str
 
-# OTP Storage
-otp_storage = {}
-
 # Helper functions for OTP
 def generate_otp():
     return ''.join(random.choices(string.digits, k=6))
 
-async def send_otp_email(email: str, otp: str):
-    # Simulate email sending
-    print(f"OTP for {email}: {otp}")  # In production, remove this line
+# In-memory per worker, with this worker's share of the deployment-wide limits
+booking_admission = AdmissionController()
+
+# Emails go through the outbox; the dispatcher delivers them off the request path
+notification_dispatcher = NotificationDispatcher()
+
+def send_otp_email(conn, email: str, otp: str):
+    enqueue_notification(
+        conn, "otp", email, "Your Parking System OTP",
+        f"Your OTP is {otp}. It expires in 10 minutes."
+    )
     return True
 
 # FIXED: Proper admin credentials with case-insensitive email matching
@@ -203,8 +274,9 @@ def initialize_default_office():
                 office_data["created_at"]
             )
             
-            db.execute_update(query, params)
-            print("✅ Default office created successfully!")
+            # OR IGNORE: every worker process runs this at startup, only one insert wins
+            if db.execute_update(query.replace("INSERT INTO", "INSERT OR IGNORE INTO"), params):
+                print("✅ Default office created successfully!")
         else:
             print("✅ Offices already exist in database")
             
@@ -219,15 +291,19 @@ def initialize_default_office():
         print(f"❌ Error creating default office: {e}")
 
 # FIXED: Function to get or create default office
+def load_offices():
+    return cache.get("offices", "offices", lambda: db.execute_query("SELECT * FROM offices"))
+
 def get_or_create_default_office():
     try:
+        offices = load_offices()
+        
         # First try to get default-office
-        office = db.execute_query("SELECT * FROM offices WHERE id = 'default-office'")
+        office = [office for office in offices if office["id"] == "default-office"]
         if office:
             return office[0]
         
         # If default-office doesn't exist, get any office
-        offices = db.execute_query("SELECT * FROM offices LIMIT 1")
         if offices:
             return offices[0]
         
@@ -242,6 +318,71 @@ def get_or_create_default_office():
         print(f"Error getting default office: {e}")
         return None
 
+# Extend an open request of the same vehicle to also cover [first_day, last_day]
+def merge_vehicle_booking(conn, existing: dict, first_day: str, last_day: str):
+    merged_first = min(existing["start_date"] or existing["parking_date"], first_day)
+    merged_last = max(existing["last_day"], last_day)
+    if find_vehicle_conflict(conn, existing["vehicle_number_norm"], merged_first, merged_last, exclude_id=existing["id"]):
+        return None
+    
+    single_day = merged_first == merged_last
+    conn.execute(
+        """
+        UPDATE parking_requests
+        SET duration_type = ?, parking_date = ?, start_date = ?, end_date = ?, updated_at = ?
+        WHERE id = ?
+        """,
+        (
+            ParkingDurationType.SINGLE_DAY.value if single_day else ParkingDurationType.DATE_RANGE.value,
+            merged_first, None if single_day else merged_first, None if single_day else merged_last,
+            datetime.now(timezone.utc).isoformat(), existing["id"]
+        )
+    )
+    record_event(
+        conn, existing["id"], existing["office_id"], existing["vehicle_type"],
+        "merged", existing["status"], existing["status"],
+        {"first_day": merged_first, "last_day": merged_last}
+    )
+    return dict(conn.execute("SELECT * FROM parking_requests WHERE id = ?", (existing["id"],)).fetchone())
+
+# Idempotency-Key support: replays return the stored response without redoing the work
+def _replayed(stored: dict) -> JSONResponse:
+    return JSONResponse(
+        status_code=stored["status_code"],
+        content=stored["body"],
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+def stored_replay(key: Optional[str], endpoint: str, payload: dict) -> Optional[JSONResponse]:
+    """Replay for a completed key, checked before admission so retries never queue or get 429."""
+    if not key:
+        return None
+    try:
+        stored = lookup_idempotent(key, endpoint, payload)
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _replayed(stored) if stored else None
+
+async def run_idempotent(key: Optional[str], endpoint: str, payload: dict, handler):
+    if not key:
+        return await handler()
+    
+    try:
+        stored = begin_idempotent(key, endpoint, payload)
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if stored:
+        return _replayed(stored)
+    
+    try:
+        result = await handler()
+    except Exception:
+        abandon_idempotent(key, endpoint)
+        raise
+    body = jsonable_encoder(result)
+    complete_idempotent(key, endpoint, 200, body)
+    return body
+
 # API Routes with SQLite implementation
 @api_router.get("/")
 async def root():
@@ -252,12 +393,16 @@ async def root():
 async def send_otp(request: OTPRequest):
     try:
         otp = generate_otp()
-        otp_storage[request.email] = {
-            'otp': otp,
-            'expires_at': datetime.now(timezone.utc) + timedelta(minutes=10)
-        }
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
         
-        await send_otp_email(request.email, otp)
+        # Stored in SQLite so any worker process can verify it
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO otp_codes (email, otp, expires_at) VALUES (?, ?, ?)",
+                (request.email, otp, expires_at.isoformat())
+            )
+            send_otp_email(conn, request.email, otp)
+        notification_dispatcher.wake()
         
         return {"message": f"OTP sent to {request.email}", "otp": otp}
     except Exception as e:
@@ -265,19 +410,25 @@ async def send_otp(request: OTPRequest):
 
 @api_router.post("/verify-otp")
 async def verify_otp(request: OTPVerify):
-    stored_otp = otp_storage.get(request.email)
-    
-    if not stored_otp:
-        raise HTTPException(status_code=400, detail="OTP not found or expired")
-    
-    if datetime.now(timezone.utc) > stored_otp['expires_at']:
-        del otp_storage[request.email]
-        raise HTTPException(status_code=400, detail="OTP expired")
-    
-    if stored_otp['otp'] != request.otp:
-        raise HTTPException(status_code=400, detail="Invalid OTP")
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        stored_otp = conn.execute("SELECT * FROM otp_codes WHERE email = ?", (request.email,)).fetchone()
+        
+        if not stored_otp:
+            error = "OTP not found or expired"
+        elif datetime.now(timezone.utc) > datetime.fromisoformat(stored_otp['expires_at']):
+            error = "OTP expired"
+        elif stored_otp['otp'] != request.otp:
+            error = "Invalid OTP"
+        else:
+            error = None
+        
+        # Expired and used codes are single-use; a wrong guess keeps the code alive
+        if stored_otp and error != "Invalid OTP":
+            conn.execute("DELETE FROM otp_codes WHERE email = ?", (request.email,))
     
-    del otp_storage[request.email]
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     return {"message": "OTP verified successfully"}
 
 # Office Management
@@ -305,145 +456,241 @@ async def create_office(office: OfficeCreate):
     return Office(**office_dict)
 
 @api_router.get("/offices", response_model=List[Office])
-async def get_offices():
-    query = "SELECT * FROM offices"
-    offices = db.execute_query(query)
-    return [Office(**office) for office in offices]
+async def get_offices(request: Request):
+    return conditional_response(
+        request, ("offices",),
+        lambda: [Office(**office) for office in load_offices()]
+    )
 
 # FIXED: Parking Request Management - COMPLETELY REWRITTEN
 @api_router.post("/parking-requests", response_model=ParkingRequest)
-async def create_parking_request(request: ParkingRequestCreate):
+async def create_parking_request(request: ParkingRequestCreate, http_request: Request,
+                                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    # With no letters or digits every such number would count as the same vehicle
+    if not normalize_vehicle_number(request.vehicle_number):
+        raise HTTPException(status_code=422, detail="Vehicle number must contain letters or digits")
+    
+    replay = stored_replay(idempotency_key, "create-parking-request", request.dict())
+    if replay:
+        return replay
+    
+    # Admission control keeps booking bursts from piling up on the SQLite write lock
+    client_key = request.emp_id or (http_request.client.host if http_request.client else "anonymous")
+    try:
+        async with booking_admission.admit(client_key):
+            return await run_idempotent(
+                idempotency_key, "create-parking-request", request.dict(),
+                lambda: _create_parking_request(request)
+            )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.reason,
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+
+async def _create_parking_request(request: ParkingRequestCreate):
     print(f"🚗 Received parking request: {request.dict()}")  # Debug log
     
     try:
-        # FIXED: Get or create default office
+        prepared = await asyncio.to_thread(_prepare_parking_request, request)
+        # The insert is group-committed with other requests arriving at the same moment
+        return await asyncio.wrap_future(
+            write_coalescer.submit(lambda conn: _insert_parking_request(conn, request, *prepared))
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error creating parking request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create parking request: {str(e)}")
+
+# Reads done outside the write transaction: office, existing user and the new row
+def _prepare_parking_request(request: ParkingRequestCreate):
+    # FIXED: Get or create default office
+    office = get_or_create_default_office()
+    if not office:
+        # If still no office, create one immediately
+        initialize_default_office()
         office = get_or_create_default_office()
         if not office:
-            # If still no office, create one immediately
-            initialize_default_office()
-            office = get_or_create_default_office()
-            if not office:
-                raise HTTPException(status_code=500, detail="No office available and could not create one")
-        
-        print(f"🏢 Using office: {office['name']} (ID: {office['id']})")
-        
-        # Update the request with the actual office ID
-        actual_office_id = office['id']
-        
-        # Create or find user
-        user = db.execute_query("SELECT * FROM users WHERE emp_id = ?", (request.emp_id,))
-        if not user:
-            user_data = UserCreate(
-                emp_id=request.emp_id,
-                name=request.name,
-                email=request.email,
-                phone=request.phone,
-                team=request.team,
-                shift=request.shift
-            )
-            user_obj = User(**user_data.dict())
-            user_dict = user_obj.dict()
-            user_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-            
-            query = """
-            INSERT INTO users (id, emp_id, name, email, phone, team, shift, role, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            params = (
-                user_dict["id"], user_dict["emp_id"], user_dict["name"],
-                user_dict["email"], user_dict["phone"], user_dict["team"],
-                user_dict["shift"], user_dict["role"], user_dict["created_at"]
-            )
-            db.execute_update(query, params)
-            user_id = user_obj.id
-            print(f"👤 Created new user: {request.name}")
-        else:
-            user_id = user[0]["id"]
-            print(f"👤 Found existing user: {user[0]['name']}")
-        
-        # Check availability
-        vehicle_slot_field = f"available_{request.vehicle_type}_slots"
-        available_slots = office.get(vehicle_slot_field, 0)
-        
-        parking_request_dict = {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "office_id": actual_office_id,  # Use actual office ID
-            "vehicle_type": request.vehicle_type,
-            "vehicle_number": request.vehicle_number,
-            "duration_type": request.duration_type,
-            "parking_date": request.parking_date,
-            "start_date": request.start_date,
-            "end_date": request.end_date,
-            "recurring_pattern": request.recurring_pattern,
-            "description": request.description,
-            "status": "pending",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        
-        if available_slots <= 0:
-            parking_request_dict["status"] = RequestStatus.WAITLIST
-            print("⚠️ No slots available - added to waitlist")
-        else:
-            print(f"✅ Slots available: {available_slots}")
+            raise HTTPException(status_code=500, detail="No office available and could not create one")
+    
+    print(f"🏢 Using office: {office['name']} (ID: {office['id']})")
+    
+    # Update the request with the actual office ID
+    actual_office_id = office['id']
+    
+    # Create or find user
+    user = db.execute_query("SELECT * FROM users WHERE emp_id = ?", (request.emp_id,))
+    if not user:
+        user_data = UserCreate(
+            emp_id=request.emp_id,
+            name=request.name,
+            email=request.email,
+            phone=request.phone,
+            team=request.team,
+            shift=request.shift
+        )
+        user_obj = User(**user_data.dict())
+        user_dict = user_obj.dict()
+        user_dict["created_at"] = datetime.now(timezone.utc).isoformat()
         
+        # OR IGNORE: a concurrent request may create the same emp_id first
         query = """
-        INSERT INTO parking_requests 
-        (id, user_id, office_id, vehicle_type, vehicle_number, duration_type, 
-         parking_date, start_date, end_date, recurring_pattern, description, 
-         status, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT OR IGNORE INTO users (id, emp_id, name, email, phone, team, shift, role, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
+        user_insert = (query, (
+            user_dict["id"], user_dict["emp_id"], user_dict["name"],
+            user_dict["email"], user_dict["phone"], user_dict["team"],
+            user_dict["shift"], user_dict["role"], user_dict["created_at"]
+        ))
+        user_id = user_obj.id
+    else:
+        user_insert = None
+        user_id = user[0]["id"]
+        print(f"👤 Found existing user: {user[0]['name']}")
+    
+    # Check availability
+    vehicle_slot_field = f"available_{request.vehicle_type}_slots"
+    available_slots = office.get(vehicle_slot_field, 0)
+    
+    parking_request_dict = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "office_id": actual_office_id,  # Use actual office ID
+        "vehicle_type": request.vehicle_type,
+        "vehicle_number": request.vehicle_number,
+        "vehicle_number_norm": normalize_vehicle_number(request.vehicle_number),
+        "duration_type": request.duration_type,
+        "parking_date": request.parking_date,
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "recurring_pattern": request.recurring_pattern,
+        "description": request.description,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    
+    if available_slots <= 0:
+        parking_request_dict["status"] = RequestStatus.WAITLIST
+        print("⚠️ No slots available - added to waitlist")
+    else:
+        print(f"✅ Slots available: {available_slots}")
+    
+    return user_insert, parking_request_dict
+
+# Unit of work for the write coalescer: user, request and its "created" event commit together
+def _insert_parking_request(conn, request: ParkingRequestCreate, user_insert, parking_request_dict: dict):
+    query = """
+    INSERT INTO parking_requests 
+    (id, user_id, office_id, vehicle_type, vehicle_number, vehicle_number_norm, duration_type, 
+     parking_date, start_date, end_date, recurring_pattern, description, 
+     status, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    first_day, last_day = booking_interval(request.parking_date, request.start_date, request.end_date)
+    merged_request = None
+    
+    # The batch holds the write lock, so the vehicle conflict check and the insert cannot interleave
+    if user_insert:
+        if conn.execute(*user_insert).rowcount:
+            print(f"👤 Created new user: {request.name}")
+        else:
+            existing = conn.execute("SELECT id FROM users WHERE emp_id = ?", (request.emp_id,)).fetchone()
+            parking_request_dict["user_id"] = existing["id"]
+    
+    conflict = None
+    if first_day:
+        conflict = find_vehicle_conflict(conn, parking_request_dict["vehicle_number_norm"], first_day, last_day)
+    if conflict:
+        # The same user re-requesting around their own open request at the same office extends it instead
+        if (conflict["user_id"] == parking_request_dict["user_id"]
+                and conflict["office_id"] == parking_request_dict["office_id"]
+                and conflict["status"] in ("pending", "waitlist")):
+            merged_request = merge_vehicle_booking(conn, conflict, first_day, last_day)
+        if not merged_request:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Vehicle {request.vehicle_number} is already booked from "
+                       f"{conflict['start_date'] or conflict['parking_date']} to {conflict['last_day']}"
+            )
+    else:
         params = (
             parking_request_dict["id"], parking_request_dict["user_id"],
             parking_request_dict["office_id"], parking_request_dict["vehicle_type"],
-            parking_request_dict["vehicle_number"], parking_request_dict["duration_type"],
+            parking_request_dict["vehicle_number"], parking_request_dict["vehicle_number_norm"],
+            parking_request_dict["duration_type"],
             parking_request_dict["parking_date"], parking_request_dict["start_date"],
             parking_request_dict["end_date"], parking_request_dict["recurring_pattern"],
             parking_request_dict["description"], parking_request_dict["status"],
             parking_request_dict["created_at"], parking_request_dict["updated_at"]
         )
-        
-        db.execute_update(query, params)
-        print("✅ Parking request saved to database")
-        
-        # Return success response
-        response_data = ParkingRequest(**parking_request_dict)
-        
-        return response_data
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"❌ Error creating parking request: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to create parking request: {str(e)}")
+        conn.execute(query, params)
+        record_event(
+            conn, parking_request_dict["id"], parking_request_dict["office_id"], request.vehicle_type,
+            "created", None, parking_request_dict["status"]
+        )
+    
+    if merged_request:
+        print(f"🔗 Merged into existing request {merged_request['id']}")
+        return ParkingRequest(**merged_request)
+    print("✅ Parking request saved to database")
+    
+    # Return success response
+    response_data = ParkingRequest(**parking_request_dict)
+    
+    return response_data
 
 @api_router.get("/parking-requests", response_model=List[dict])
-async def get_parking_requests(status: Optional[str] = None):
-    if status:
-        query = "SELECT * FROM parking_requests WHERE status = ?"
-        requests = db.execute_query(query, (status,))
-    else:
-        query = "SELECT * FROM parking_requests"
-        requests = db.execute_query(query)
+async def get_parking_requests(status: Optional[str] = None, format: str = "rows"):
+    where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+    # Closed requests may have been archived; the dashboard counts those too
+    source = "all_parking_requests" if status in CLOSED_STATUSES else "parking_requests"
+    requests = db.execute_query(f"SELECT * FROM {source} {where}", params)
+    
+    # One lookup per table instead of two queries per row
+    users = {
+        user["id"]: user for user in db.execute_query(
+            f"SELECT id, name, email FROM users WHERE id IN (SELECT user_id FROM {source} {where})", params
+        )
+    }
+    offices = {office["id"]: office["name"] for office in load_offices()}
+    
+    if format == "columnar":
+        # Each user/office string is sent once, rows refer to them by id
+        columns = list(requests[0].keys()) if requests else []
+        return JSONResponse({
+            "format": "columnar",
+            "columns": columns,
+            "rows": [list(req.values()) for req in requests],
+            "users": {user_id: [user["name"], user["email"]] for user_id, user in users.items()},
+            "offices": offices
+        })
     
     # Populate with user and office data
     enriched_requests = []
     for req in requests:
-        user = db.execute_query("SELECT * FROM users WHERE id = ?", (req["user_id"],))
-        office = db.execute_query("SELECT * FROM offices WHERE id = ?", (req["office_id"],))
+        user = users.get(req["user_id"])
         
         enriched_request = dict(req)
-        enriched_request["user_name"] = user[0]["name"] if user else "Unknown"
-        enriched_request["user_email"] = user[0]["email"] if user else "Unknown"
-        enriched_request["office_name"] = office[0]["name"] if office else "Unknown"
+        enriched_request["user_name"] = user["name"] if user else "Unknown"
+        enriched_request["user_email"] = user["email"] if user else "Unknown"
+        enriched_request["office_name"] = offices.get(req["office_id"], "Unknown")
         enriched_requests.append(enriched_request)
     
     return enriched_requests
 
 @api_router.get("/parking-requests/user/{emp_id}")
-async def get_user_requests_by_emp_id(emp_id: str):
+async def get_user_requests_by_emp_id(emp_id: str, request: Request):
+    return conditional_response(
+        request, ("users", "parking_requests", "offices"),
+        lambda: build_user_requests(emp_id)
+    )
+
+def build_user_requests(emp_id: str):
     user = db.execute_query("SELECT * FROM users WHERE emp_id = ?", (emp_id,))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -460,6 +707,11 @@ async def get_user_requests_by_emp_id(emp_id: str):
     
     return enriched_requests
 
+# Full-text search over requests, their owners and vehicle numbers
+@api_router.get("/search")
+async def search(q: str, limit: int = 20, offset: int = 0):
+    return search_requests(q, limit=max(1, min(limit, 100)), offset=max(0, offset))
+
 # FIXED: Admin Authentication - Improved with better error handling
 @api_router.post("/admin/login")
 async def admin_login(credentials: AdminLogin):
@@ -495,58 +747,144 @@ async def admin_login(credentials: AdminLogin):
 
 # Admin Operations
 @api_router.post("/admin/approve-request")
-async def approve_reject_request(approval: AdminApproval):
-    request_doc = db.execute_query("SELECT * FROM parking_requests WHERE id = ?", (approval.request_id,))
-    if not request_doc:
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    request_data = request_doc[0]
-    update_data = {
-        "status": approval.status,
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    if approval.status == RequestStatus.APPROVED:
-        # Assign slot and reduce availability
-        office = db.execute_query("SELECT * FROM offices WHERE id = ?", (request_data["office_id"],))
-        vehicle_type = request_data["vehicle_type"]
-        office_data = office[0]
+async def approve_reject_request(approval: AdminApproval,
+                                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    return await run_idempotent(
+        idempotency_key, "approve-request", approval.dict(),
+        lambda: _approve_reject_request(approval)
+    )
+
+async def _approve_reject_request(approval: AdminApproval):
+    with db.transaction() as conn:
+        # Write lock up front so the conflict check and the update cannot interleave
+        conn.execute("BEGIN IMMEDIATE")
+        request_doc = conn.execute("SELECT * FROM parking_requests WHERE id = ?", (approval.request_id,)).fetchone()
+        if not request_doc:
+            raise HTTPException(status_code=404, detail="Request not found")
+        
+        request_data = dict(request_doc)
+        was_approved = request_data["status"] == ApprovalStatus.APPROVED
+        if was_approved and approval.status == ApprovalStatus.APPROVED:
+            # Already holds a slot; approving again must not take a second one
+            return {"message": "Request approved successfully"}
+        update_data = {
+            "status": approval.status,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
         
-        if vehicle_type == VehicleType.CAR:
-            slot_number = f"C-{office_data['total_car_slots'] - office_data['available_car_slots'] + 1}"
-            db.execute_update(
-                "UPDATE offices SET available_car_slots = available_car_slots - 1 WHERE id = ?",
-                (request_data["office_id"],)
+        if approval.status == ApprovalStatus.APPROVED:
+            # A rejected request may be re-approved after someone else booked the vehicle for those days
+            first_day, last_day = booking_interval(
+                request_data["parking_date"], request_data["start_date"], request_data["end_date"]
             )
-        else:
-            slot_number = f"B-{office_data['total_bike_slots'] - office_data['available_bike_slots'] + 1}"
-            db.execute_update(
-                "UPDATE offices SET available_bike_slots = available_bike_slots - 1 WHERE id = ?",
-                (request_data["office_id"],)
+            conflict = first_day and find_vehicle_conflict(
+                conn, request_data["vehicle_number_norm"] or normalize_vehicle_number(request_data["vehicle_number"]),
+                first_day, last_day, exclude_id=request_data["id"]
             )
+            if conflict:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Vehicle {request_data['vehicle_number']} is already booked from "
+                           f"{conflict['start_date'] or conflict['parking_date']} to {conflict['last_day']}"
+                )
+            
+            # Assign slot and reduce availability
+            office_data = conn.execute("SELECT * FROM offices WHERE id = ?", (request_data["office_id"],)).fetchone()
+            vehicle_type = request_data["vehicle_type"]
+            
+            # Lowest slot no approval holds, so slot numbers stay unique once others expire
+            if vehicle_type == VehicleType.CAR:
+                slot_number = (next_free_slot(conn, request_data["office_id"], "car", office_data["total_car_slots"])
+                               or f"C-{office_data['total_car_slots'] - office_data['available_car_slots'] + 1}")
+                conn.execute(
+                    "UPDATE offices SET available_car_slots = available_car_slots - 1 WHERE id = ?",
+                    (request_data["office_id"],)
+                )
+            else:
+                slot_number = (next_free_slot(conn, request_data["office_id"], "bike", office_data["total_bike_slots"])
+                               or f"B-{office_data['total_bike_slots'] - office_data['available_bike_slots'] + 1}")
+                conn.execute(
+                    "UPDATE offices SET available_bike_slots = available_bike_slots - 1 WHERE id = ?",
+                    (request_data["office_id"],)
+                )
+            
+            update_data["slot_number"] = slot_number
+            update_data["approved_by"] = "admin"
         
-        update_data["slot_number"] = slot_number
-        update_data["approved_by"] = "admin"
-    
-    elif approval.status == RequestStatus.REJECTED:
-        update_data["rejection_reason"] = approval.rejection_reason
-    
-    # Build update query
-    set_clause = ", ".join([f"{key} = ?" for key in update_data.keys()])
-    query = f"UPDATE parking_requests SET {set_clause} WHERE id = ?"
-    params = tuple(update_data.values()) + (approval.request_id,)
-    
-    db.execute_update(query, params)
+        elif approval.status == ApprovalStatus.REJECTED:
+            update_data["rejection_reason"] = approval.rejection_reason
+        
+        if was_approved:
+            # Leaving approved: the sweeper only frees slots of approved requests, so free it here
+            release_slot(conn, request_data["office_id"], request_data["vehicle_type"],
+                         request_data["slot_number"], request_data["id"])
+            update_data["slot_number"] = None
+        
+        user = conn.execute("SELECT name, email FROM users WHERE id = ?", (request_data["user_id"],)).fetchone()
+        booking_day = request_data["start_date"] or request_data["parking_date"]
+        if user and approval.status == ApprovalStatus.APPROVED:
+            enqueue_notification(
+                conn, "approval", user["email"], "Parking request approved",
+                f"Hi {user['name']}, your parking request for {booking_day} is approved. "
+                f"Your slot is {update_data['slot_number']}."
+            )
+        elif user and approval.status == ApprovalStatus.REJECTED:
+            enqueue_notification(
+                conn, "rejection", user["email"], "Parking request rejected",
+                f"Hi {user['name']}, your parking request for {booking_day} was rejected."
+                + (f" Reason: {approval.rejection_reason}" if approval.rejection_reason else "")
+            )
+        
+        # Build update query
+        set_clause = ", ".join([f"{key} = ?" for key in update_data.keys()])
+        query = f"UPDATE parking_requests SET {set_clause} WHERE id = ?"
+        params = tuple(update_data.values()) + (approval.request_id,)
+        
+        conn.execute(query, params)
+        record_event(
+            conn, approval.request_id, request_data["office_id"], request_data["vehicle_type"],
+            "status_changed", request_data["status"], approval.status,
+            {key: value for key, value in update_data.items() if key in ("slot_number", "rejection_reason")} or None
+        )
     
+    notification_dispatcher.wake()
     return {"message": f"Request {approval.status} successfully"}
 
+# Batch allocation for days where demand outstrips capacity, instead of approving one by one
+@api_router.post("/admin/allocate")
+async def allocate_parking(run: AllocationRun):
+    try:
+        datetime.strptime(run.date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=422, detail="date must be YYYY-MM-DD")
+    try:
+        result = await asyncio.to_thread(
+            allocate_day, run.date, run.office_id, run.vehicle_type.value, run.dry_run, run.history_days
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if result["allocated"] and not run.dry_run:
+        notification_dispatcher.wake()
+    return result
+
 @api_router.get("/admin/dashboard")
-async def get_admin_dashboard():
-    # Get counts by status
-    pending_count = len(db.execute_query("SELECT * FROM parking_requests WHERE status = 'pending'"))
-    approved_count = len(db.execute_query("SELECT * FROM parking_requests WHERE status = 'approved'"))
-    rejected_count = len(db.execute_query("SELECT * FROM parking_requests WHERE status = 'rejected'"))
-    waitlist_count = len(db.execute_query("SELECT * FROM parking_requests WHERE status = 'waitlist'"))
+async def get_admin_dashboard(request: Request):
+    return conditional_response(request, ("parking_requests", "offices"), build_admin_dashboard)
+
+def build_admin_dashboard():
+    # Get counts by status, archived requests included; both sides count off a status index
+    counts = {row["status"]: row["total"] for row in db.execute_query("""
+        SELECT status, SUM(n) AS total FROM (
+            SELECT status, COUNT(*) AS n FROM parking_requests GROUP BY status
+            UNION ALL
+            SELECT status, COUNT(*) AS n FROM parking_requests_archive GROUP BY status
+        ) GROUP BY status
+    """)}
+    pending_count = counts.get("pending", 0)
+    approved_count = counts.get("approved", 0)
+    rejected_count = counts.get("rejected", 0)
+    waitlist_count = counts.get("waitlist", 0)
+    expired_count = counts.get("expired", 0)
     
     # Get office utilization
     offices = db.execute_query("SELECT * FROM offices")
@@ -568,11 +906,93 @@ async def get_admin_dashboard():
             "pending": pending_count,
             "approved": approved_count,
             "rejected": rejected_count,
-            "waitlist": waitlist_count
+            "waitlist": waitlist_count,
+            "expired": expired_count
         },
         "office_stats": office_stats
     }
 
+# Job metrics are per worker process; worker_pid says which one answered
+@api_router.get("/admin/sweeper-stats")
+async def get_sweeper_stats():
+    return {**sweeper_metrics, "worker_pid": os.getpid()}
+
+@api_router.get("/admin/archive-stats")
+async def get_archive_stats():
+    return {**archive_metrics, "worker_pid": os.getpid()}
+
+@api_router.post("/admin/archive")
+async def archive_requests(retention_days: int = Query(ARCHIVE_RETENTION_DAYS, ge=0, le=36500)):
+    archived = await asyncio.to_thread(archive_closed_requests, retention_days)
+    return {"archived": archived, "retention_days": retention_days}
+
+# Statement profiler; stats are per worker process
+@api_router.get("/admin/query-stats")
+async def get_query_stats(limit: int = 20, order_by: str = "total_ms"):
+    if order_by not in ("total_ms", "avg_ms", "max_ms", "calls", "rows"):
+        raise HTTPException(status_code=422, detail="order_by must be total_ms, avg_ms, max_ms, calls or rows")
+    profiler = db.profiler
+    return {
+        "enabled": profiler is not None,
+        "slow_query_ms": profiler.slow_query_ms if profiler else None,
+        "statements": profiler.top(max(1, min(limit, 500)), order_by) if profiler else [],
+    }
+
+@api_router.post("/admin/query-profiling")
+async def set_query_profiling(settings: ProfilingSettings):
+    if settings.enabled:
+        profiler = db.enable_profiling(settings.slow_query_ms)
+        if settings.reset:
+            profiler.reset()
+    else:
+        db.disable_profiling()
+    return {"enabled": settings.enabled, "slow_query_ms": settings.slow_query_ms if settings.enabled else None}
+
+@api_router.get("/admin/admission-stats")
+async def get_admission_stats():
+    return booking_admission.snapshot()
+
+@api_router.get("/admin/write-stats")
+async def get_write_stats():
+    return write_coalescer.snapshot()
+
+@api_router.get("/admin/notifications/stats")
+async def get_notification_stats():
+    return outbox_stats()
+
+# Request event log
+@api_router.get("/admin/events")
+async def list_request_events(start: Optional[str] = None, end: Optional[str] = None,
+                              request_id: Optional[str] = None, limit: int = 500):
+    return get_events(start=start, end=end, request_id=request_id, limit=min(limit, 5000))
+
+@api_router.post("/admin/events/compact")
+async def compact_request_events(before: str):
+    return compact_events(before)
+
+@api_router.post("/admin/rebuild-availability")
+async def rebuild_availability():
+    return {"offices": rebuild_office_availability()}
+
+# Historical utilisation, answered from the daily rollups
+@api_router.get("/admin/analytics")
+async def get_analytics(start: Optional[str] = None, end: Optional[str] = None, group_by: str = "day",
+                        office_id: Optional[str] = None, vehicle_type: Optional[VehicleType] = None):
+    if group_by not in GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUPINGS)}")
+    end = end or datetime.now(timezone.utc).date().isoformat()
+    try:
+        start = start or (datetime.fromisoformat(end) - timedelta(days=30)).date().isoformat()
+        rows = query_analytics(start, end, group_by, office_id, vehicle_type.value if vehicle_type else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date range: {str(e)}")
+    return {"start": start, "end": end, "group_by": group_by, "rows": rows}
+
+@api_router.post("/admin/analytics/backfill")
+async def backfill_analytics():
+    rows = await asyncio.to_thread(backfill_rollups)
+    return {"rollup_rows": rows}
+
 # Include the router in the main app (AFTER CORS configuration)
 app.include_router(api_router)
 
@@ -583,13 +1003,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize default office when app starts
-@app.on_event("startup")
-async def startup_event():
-    print("🚀 Starting Parking Management System...")
-    initialize_default_office()
-    print("✅ Startup completed!")
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # WEB_CONCURRENCY > 1 runs several worker processes; all shared state lives in SQLite
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        uvicorn.run("server:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, date
+from typing import Dict, Optional, Tuple
+
+from database import db
+from events import record_events
+
+logger = logging.getLogger(__name__)
+
+# How often the sweeper wakes up and how many expired approvals it handles per transaction
+SWEEP_INTERVAL_SECONDS = 15 * 60
+SWEEP_BATCH_SIZE = 500
+
+# Running totals exposed through /api/admin/sweeper-stats
+sweeper_metrics = {
+    "runs": 0,
+    "requests_expired": 0,
+    "slots_reclaimed": {"car": 0, "bike": 0},
+    "last_run_at": None,
+    "last_run_reclaimed": 0,
+    "last_error": None,
+}
+
+
+def _expire_batch(today: str, batch_size: int) -> Tuple[int, Dict[Tuple[str, str], int]]:
+    """Expire one batch of past approvals and hand their slots back to the offices.
+
+    Returns the number of requests expired and the slots freed per (office, vehicle type).
+    """
+    with db.transaction() as conn:
+        # Take the write lock up front so counters and statuses move together
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """
+            SELECT id, office_id, vehicle_type, slot_number FROM parking_requests
+            WHERE status = 'approved' AND COALESCE(end_date, parking_date) < ?
+            LIMIT ?
+            """,
+            (today, batch_size)
+        ).fetchall()
+        if not rows:
+            return 0, {}
+
+        now = datetime.now(timezone.utc).isoformat()
+        conn.executemany(
+            "UPDATE parking_requests SET status = 'expired', updated_at = ? WHERE id = ?",
+            [(now, row["id"]) for row in rows]
+        )
+        record_events(conn, [
+            (row["id"], row["office_id"], row["vehicle_type"], "expired", "approved", "expired")
+            for row in rows
+        ])
+
+        # Shifts can share a slot; it is only free once no approval holds its number
+        slots = {}
+        for row in rows:
+            key = (row["office_id"], row["vehicle_type"])
+            slots.setdefault(key, set()).add(row["slot_number"] or row["id"])
+        released = {}
+        for (office_id, vehicle_type), numbers in slots.items():
+            still_held = {held["slot_number"] for held in conn.execute(
+                f"""
+                SELECT DISTINCT slot_number FROM parking_requests
+                WHERE office_id = ? AND vehicle_type = ? AND status = 'approved'
+                  AND slot_number IN ({', '.join('?' for _ in numbers)})
+                """,
+                (office_id, vehicle_type, *numbers)
+            )}
+            released[(office_id, vehicle_type)] = len(numbers - still_held)
+
+        for (office_id, vehicle_type), count in released.items():
+            if vehicle_type not in ("car", "bike"):
+                continue
+            conn.execute(
+                f"""
+                UPDATE offices
+                SET available_{vehicle_type}_slots = MIN(total_{vehicle_type}_slots, available_{vehicle_type}_slots + ?)
+                WHERE id = ?
+                """,
+                (count, office_id)
+            )
+        return len(rows), released
+
+
+def sweep_expired_requests(today: Optional[str] = None, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Free the slots of every approval whose last day is before ``today``.
+
+    Returns the number of slots reclaimed in this run.
+    """
+    today = today or date.today().isoformat()
+    reclaimed = 0
+    try:
+        while True:
+            expired, released = _expire_batch(today, batch_size)
+            if not expired:
+                break
+            sweeper_metrics["requests_expired"] += expired
+            for (_, vehicle_type), count in released.items():
+                reclaimed += count
+                if vehicle_type in sweeper_metrics["slots_reclaimed"]:
+                    sweeper_metrics["slots_reclaimed"][vehicle_type] += count
+            if expired < batch_size:
+                break
+        sweeper_metrics["last_error"] = None
+    except Exception as e:
+        sweeper_metrics["last_error"] = str(e)
+        logger.exception("Expiry sweep failed")
+    finally:
+        sweeper_metrics["runs"] += 1
+        sweeper_metrics["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        sweeper_metrics["last_run_reclaimed"] = reclaimed
+
+    if reclaimed:
+        logger.info(f"Expiry sweeper reclaimed {reclaimed} slot(s)")
+    return reclaimed
+
+
+async def run_expiry_sweeper(interval: float = SWEEP_INTERVAL_SECONDS):
+    """Lifespan task: sweep once at startup and then on a fixed interval."""
+    while True:
+        await asyncio.to_thread(sweep_expired_requests)
+        await asyncio.sleep(interval)
@@ -0,0 +1,51 @@
+import re
+from typing import Optional, Dict
+
+# Requests in these states hold (or may soon hold) the vehicle's booking for their dates
+ACTIVE_STATUSES = ("pending", "approved", "waitlist")
+# Inlined rather than bound, so the planner can match the partial index's WHERE clause
+ACTIVE_STATUS_SQL = f"status IN ({', '.join(repr(status) for status in ACTIVE_STATUSES)})"
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_vehicle_number(vehicle_number: Optional[str]) -> str:
+    """'tn-09 ab 1234' and 'TN09AB1234' are the same vehicle."""
+    return _NON_ALNUM.sub("", (vehicle_number or "").upper())
+
+
+def booking_interval(parking_date: Optional[str], start_date: Optional[str],
+                     end_date: Optional[str]) -> tuple:
+    """First and last day a booking covers, matching the interval index expressions."""
+    first = start_date or parking_date
+    last = end_date or parking_date or start_date
+    if first and last and last < first:
+        last = first
+    return first, last
+
+
+def find_vehicle_conflict(conn, vehicle_number_norm: str, first_day: str, last_day: str,
+                          exclude_id: Optional[str] = None) -> Optional[Dict]:
+    """Return an active booking of the vehicle overlapping [first_day, last_day], if any.
+
+    Descending range scan on idx_parking_requests_vehicle_active, which
+    holds active bookings only: the vehicle's bookings starting on or
+    before ``last_day``, filtered on their last day from the index itself.
+    It does not assume active bookings of a vehicle never overlap, so
+    legacy or re-approved overlapping rows are still found.
+    """
+    row = conn.execute(
+        f"""
+        SELECT *, COALESCE(end_date, parking_date, start_date) AS last_day
+        FROM parking_requests
+        WHERE vehicle_number_norm = ?
+          AND COALESCE(start_date, parking_date) <= ?
+          AND COALESCE(end_date, parking_date, start_date) >= ?
+          AND {ACTIVE_STATUS_SQL}
+          AND id != ?
+        ORDER BY COALESCE(start_date, parking_date) DESC
+        LIMIT 1
+        """,
+        (vehicle_number_norm, last_day, first_day, exclude_id or "")
+    ).fetchone()
+    return dict(row) if row else None
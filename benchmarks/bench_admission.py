@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Overload test for admission control on POST /api/parking-requests.
+
+Simulates the 9:00 rush: BURST clients submit at once, in several waves, to
+the in-process app backed by a throwaway database. The same load runs with
+admission control effectively disabled and with the default settings, and
+reports goodput, rejections, errors and latency for each. A second scenario
+has one client flooding the endpoint while others submit once.
+
+    python benchmarks/bench_admission.py [burst] [waves]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import httpx  # noqa: E402
+
+BURST = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+WAVES = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def submit(client, wave, i, results, emp_id=None):
+    body = {
+        "emp_id": emp_id or f"EMP{wave}-{i}", "name": "Rush Hour", "email": f"rush{i}@company.com",
+        "phone": "1", "vehicle_type": "bike", "vehicle_number": f"RUSH{wave}X{i}",
+        "parking_date": "2030-01-01",
+    }
+    started = time.perf_counter()
+    try:
+        response = await client.post("/api/parking-requests", json=body)
+        code = response.status_code
+    except Exception:
+        code = "error"
+    results.append((code, time.perf_counter() - started))
+
+
+async def run(label, controller):
+    import server
+    server.booking_admission = controller
+    results = []
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for wave in range(WAVES):
+            await asyncio.gather(*(submit(client, f"{label}{wave}", i, results) for i in range(BURST)))
+        elapsed = time.perf_counter() - started
+
+    ok = [latency for code, latency in results if code == 200]
+    rejected = [latency for code, latency in results if code == 429]
+    failed = [code for code, _ in results if code not in (200, 429)]
+    print(f"{label:>10}: {len(ok) / elapsed:6.0f} writes/s  ok={len(ok)} 429={len(rejected)} errors={len(failed)}  "
+          f"ok p50={percentile(ok, .5) * 1000:.0f}ms p99={percentile(ok, .99) * 1000:.0f}ms  "
+          f"429 p99={percentile(rejected, .99) * 1000:.0f}ms")
+
+
+async def noisy_neighbour(label, controller):
+    # One client hammers the endpoint while everyone else submits once
+    import server
+    server.booking_admission = controller
+    noisy, others = [], []
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(
+            *(submit(client, f"{label}-noisy", i, noisy, emp_id=f"NOISY-{label}") for i in range(BURST)),
+            *(submit(client, f"{label}-quiet", i, others) for i in range(BURST // 10)),
+        )
+    ok = [latency for code, latency in others if code == 200]
+    print(f"{label:>10}: noisy client ok={sum(1 for code, _ in noisy if code == 200)}/{BURST}  "
+          f"other clients ok={len(ok)}/{BURST // 10} p50={percentile(ok, .5) * 1000:.0f}ms "
+          f"p99={percentile(ok, .99) * 1000:.0f}ms")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import server
+        from admission import AdmissionController
+        server.initialize_default_office()
+        asyncio.run(run("unbounded", AdmissionController(max_concurrent=1000, max_queued=10 ** 6)))
+        asyncio.run(run("admission", AdmissionController()))
+        asyncio.run(noisy_neighbour("unbounded", AdmissionController(rate=10 ** 6, burst=10 ** 6,
+                                                                     max_concurrent=1000, max_queued=10 ** 6)))
+        asyncio.run(noisy_neighbour("admission", AdmissionController()))
+
+
+if __name__ == "__main__":
+    main()
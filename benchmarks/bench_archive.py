@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Archival of closed requests: batch lock times and the effect on hot reads.
+
+Fills a throwaway database with ROWS requests, CLOSED_SHARE of them
+rejected or expired long ago, times the admin-listing scan, archives,
+and times it again. Reports the longest single batch, which is how long
+other writers can be kept waiting.
+
+    python benchmarks/bench_archive.py [rows] [closed_share]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from database import db  # noqa: E402
+import archive  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+CLOSED_SHARE = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+
+
+def time_listing():
+    started = time.perf_counter()
+    for status in (None, "pending"):
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        db.execute_query(f"SELECT * FROM parking_requests {where}", params)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db.db_path = os.path.join(tmp, "parking.db")
+        db._schema_ready = False
+        closed = int(ROWS * CLOSED_SHARE)
+        with db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO parking_requests (id, user_id, office_id, vehicle_type, vehicle_number, "
+                "duration_type, parking_date, status, created_at, updated_at) "
+                "VALUES (?, 'u', 'o', 'car', ?, 'single_day', '2020-01-01', ?, '2020-01-01', ?)",
+                [(f"r{i}", f"V{i}", ("rejected", "expired")[i % 2] if i < closed else "pending",
+                  "2020-01-01" if i < closed else "2999-01-01") for i in range(ROWS)]
+            )
+        print(f"{ROWS} rows, {closed} closed; listing (all + pending): {time_listing():.0f}ms")
+
+        batch_times = []
+        original = archive._archive_batch
+
+        def timed_batch(*args):
+            started = time.perf_counter()
+            try:
+                return original(*args)
+            finally:
+                batch_times.append((time.perf_counter() - started) * 1000)
+
+        archive._archive_batch = timed_batch
+        started = time.perf_counter()
+        moved = archive.archive_closed_requests(retention_days=30)
+        elapsed = time.perf_counter() - started
+        print(f"archived {moved} rows in {elapsed:.1f}s over {len(batch_times)} batches; "
+              f"longest batch {max(batch_times):.0f}ms, median {sorted(batch_times)[len(batch_times) // 2]:.0f}ms")
+        print(f"listing after archival: {time_listing():.0f}ms; "
+              f"unified view still has {db.execute_query('SELECT COUNT(*) AS n FROM all_parking_requests')[0]['n']} rows")
+
+
+if __name__ == "__main__":
+    main()
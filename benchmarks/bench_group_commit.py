@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Sustained insert throughput: one commit per parking request vs group commit.
+
+WRITERS threads each insert ROWS_PER_WRITER requests (row + "created" event,
+as the API does) into a throwaway database. The first pass commits every
+request on its own; the second submits them to the WriteCoalescer. Both
+run with SQLite's default synchronous setting in WAL mode, which is printed
+so the durability setting is visible next to the numbers.
+
+    python benchmarks/bench_group_commit.py [writers] [rows_per_writer] [dir]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from database import db  # noqa: E402
+from events import record_event  # noqa: E402
+from coalescer import WriteCoalescer  # noqa: E402
+
+WRITERS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+ROWS_PER_WRITER = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+DIRECTORY = sys.argv[3] if len(sys.argv) > 3 else None
+
+
+def insert_request(conn):
+    now = datetime.now(timezone.utc).isoformat()
+    request_id = str(uuid.uuid4())
+    conn.execute(
+        """
+        INSERT INTO parking_requests (id, user_id, office_id, vehicle_type, vehicle_number,
+            vehicle_number_norm, duration_type, parking_date, status, created_at, updated_at)
+        VALUES (?, 'bench-user', 'bench-office', 'car', ?, ?, 'single_day', '2030-01-01', 'pending', ?, ?)
+        """,
+        (request_id, request_id[:8], request_id[:8].upper(), now, now)
+    )
+    record_event(conn, request_id, "bench-office", "car", "created", None, "pending")
+    return request_id
+
+
+def commit_each():
+    with db.transaction() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        insert_request(conn)
+
+
+def measure(label, write_one):
+    barrier = threading.Barrier(WRITERS)
+
+    def writer():
+        barrier.wait()
+        for _ in range(ROWS_PER_WRITER):
+            write_one()
+
+    threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rows = WRITERS * ROWS_PER_WRITER
+    print(f"{label:>16}: {rows / elapsed:8.0f} inserts/s  ({rows} rows in {elapsed:.2f}s)")
+    return rows / elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory(dir=DIRECTORY) as tmp:
+        db.db_path = os.path.join(tmp, "parking.db")
+        db._schema_ready = False
+        conn = db.connect()
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        print(f"journal_mode={journal} synchronous={synchronous} (2 = FULL), "
+              f"{WRITERS} writers x {ROWS_PER_WRITER} rows\n")
+
+        baseline = measure("commit per row", commit_each)
+        coalescer = WriteCoalescer()
+        grouped = measure("group commit", lambda: coalescer.run(insert_request))
+        print(f"\nspeedup {grouped / baseline:.1f}x, average batch {coalescer.snapshot()['avg_batch']}")
+
+
+if __name__ == "__main__":
+    main()
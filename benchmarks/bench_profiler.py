@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Cost of the query profiler on a typical short lookup.
+
+Runs execute_query for a primary-key lookup ITERATIONS times against a
+throwaway database with profiling off and on, and compares both with
+plain sqlite3 on one connection per call, which is what Database did
+before the profiler existed.
+
+    python benchmarks/bench_profiler.py [iterations]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from database import Database, BUSY_TIMEOUT_SECONDS  # noqa: E402
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+QUERY = "SELECT * FROM offices WHERE id = ?"
+
+
+def per_call(label, run):
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        run()
+    micros = (time.perf_counter() - started) / ITERATIONS * 1e6
+    print(f"{label:>18}: {micros:6.1f} µs/query")
+    return micros
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "parking.db"))
+        db.execute_update("INSERT INTO offices VALUES ('o1', 'HQ', 'x', 1, 1, 1, 1, 'now')")
+
+        def raw():
+            conn = sqlite3.connect(db.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.row_factory = sqlite3.Row
+            [dict(row) for row in conn.execute(QUERY, ("o1",)).fetchall()]
+            conn.close()
+
+        baseline = per_call("plain sqlite3", raw)
+        disabled = per_call("profiling off", lambda: db.execute_query(QUERY, ("o1",)))
+        db.enable_profiling()
+        enabled = per_call("profiling on", lambda: db.execute_query(QUERY, ("o1",)))
+        print(f"\noff: {disabled - baseline:+.1f} µs vs plain, on: {enabled - disabled:+.1f} µs per query")
+        print(db.profiler.top(limit=1)[0])
+
+
+if __name__ == "__main__":
+    main()
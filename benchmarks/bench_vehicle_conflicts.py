@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-vehicle interval index used by create_parking_request.
+
+Builds a throwaway database with ROWS bookings (VEHICLES vehicles, back-to-back
+non-overlapping date ranges each, all but the last ACTIVE_PER_VEHICLE of them
+expired) and compares the indexed conflict lookup against the naive
+full-table scan it replaces.
+
+    python benchmarks/bench_vehicle_conflicts.py [rows]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from database import Database  # noqa: E402
+from vehicles import find_vehicle_conflict  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+BOOKINGS_PER_VEHICLE = 10
+ACTIVE_PER_VEHICLE = 2
+VEHICLES = ROWS // BOOKINGS_PER_VEHICLE
+LOOKUPS = 2000
+
+
+def build(db):
+    base = date(2030, 1, 1)
+    now = base.isoformat()
+    with db.transaction() as conn:
+        for chunk_start in range(0, VEHICLES, 10_000):
+            rows = []
+            for v in range(chunk_start, min(chunk_start + 10_000, VEHICLES)):
+                plate = f"TN{v:08d}"
+                for b in range(BOOKINGS_PER_VEHICLE):
+                    first = base + timedelta(days=b * 7)
+                    last = first + timedelta(days=2)
+                    rows.append((
+                        f"{v}-{b}", "u", "default-office", "car", plate, plate, "date_range",
+                        None, first.isoformat(), last.isoformat(),
+                        "approved" if b >= BOOKINGS_PER_VEHICLE - ACTIVE_PER_VEHICLE else "expired", now, now
+                    ))
+            conn.executemany(
+                """
+                INSERT INTO parking_requests
+                (id, user_id, office_id, vehicle_type, vehicle_number, vehicle_number_norm, duration_type,
+                 parking_date, start_date, end_date, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+
+
+def naive_conflict(conn, plate, first_day, last_day):
+    # What a check without the normalised column and interval index looks like
+    for row in conn.execute("SELECT * FROM parking_requests NOT INDEXED WHERE status = 'approved'"):
+        if row["vehicle_number"].replace("-", "").upper() != plate:
+            continue
+        if (row["start_date"] or row["parking_date"]) <= last_day and (row["end_date"] or row["parking_date"]) >= first_day:
+            return dict(row)
+    return None
+
+
+def main():
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        started = time.perf_counter()
+        build(db)
+        print(f"built {ROWS:,} bookings in {time.perf_counter() - started:.1f}s")
+
+        probes = []
+        for _ in range(LOOKUPS):
+            plate = f"TN{random.randrange(VEHICLES):08d}"
+            first = date(2030, 1, 1) + timedelta(days=random.randrange(80))
+            probes.append((plate, first.isoformat(), (first + timedelta(days=1)).isoformat()))
+
+        with db.transaction() as conn:
+            started = time.perf_counter()
+            hits = sum(1 for probe in probes if find_vehicle_conflict(conn, *probe))
+            indexed = (time.perf_counter() - started) / LOOKUPS
+            print(f"indexed: {indexed * 1e6:.1f} us/lookup ({hits}/{LOOKUPS} conflicts)")
+
+            sample = probes[:3]
+            started = time.perf_counter()
+            for probe in sample:
+                naive_conflict(conn, *probe)
+            naive = (time.perf_counter() - started) / len(sample)
+            print(f"naive scan: {naive * 1e3:.1f} ms/lookup -> {naive / indexed:,.0f}x slower")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Measure API throughput as the number of uvicorn worker processes grows.
+
+Each run starts `uvicorn server:app --workers N` against a fresh database in a
+temporary directory, then drives it from several client processes for a fixed
+time with a read-mostly mix (offices listing, dashboard, user status) plus
+parking-request submissions.
+
+    python benchmarks/bench_workers.py [max_workers] [seconds]
+
+Only worker counts up to the number of CPUs say anything about scaling;
+beyond that the workers (and the client processes) time-share cores and
+throughput falls. Runs past os.cpu_count() are marked as such.
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+MAX_WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+CLIENTS = 8
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def client(port, client_id, deadline, results):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    done = errors = 0
+    while time.time() < deadline:
+        if done % 10 == 0:
+            body = json.dumps({
+                "emp_id": f"B{client_id}-{done}", "name": "Bench", "email": "bench@company.com",
+                "phone": "1", "vehicle_type": "bike", "vehicle_number": f"BN{client_id}X{done}",
+                "parking_date": "2030-01-01"
+            })
+            conn.request('POST', '/api/parking-requests', body, {'Content-Type': 'application/json'})
+        else:
+            path = ('/api/offices', '/api/admin/dashboard', f'/api/parking-requests/user/B{client_id}-0')[done % 3]
+            conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        errors += response.status >= 500
+        done += 1
+    results.put((done, errors))
+
+
+def run(workers):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'server:app', '--app-dir', os.path.abspath(BACKEND_DIR),
+             '--port', str(port), '--workers', str(workers), '--log-level', 'warning'],
+            cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_ready(port)
+            results = multiprocessing.Queue()
+            deadline = time.time() + DURATION
+            clients = [multiprocessing.Process(target=client, args=(port, i, deadline, results)) for i in range(CLIENTS)]
+            for process in clients:
+                process.start()
+            totals = [results.get() for _ in clients]
+            for process in clients:
+                process.join()
+        finally:
+            server.terminate()
+            server.wait()
+    requests = sum(done for done, _ in totals)
+    errors = sum(errors for _, errors in totals)
+    return requests / DURATION, errors
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    print(f"{cpus} CPU(s), {CLIENTS} client processes")
+    workers = 1
+    baseline = None
+    while workers <= MAX_WORKERS:
+        throughput, errors = run(workers)
+        baseline = baseline or throughput
+        note = "  [more workers than CPUs: time-shared, not a scaling result]" if workers > cpus else ""
+        print(f"{workers} worker(s): {throughput:8.0f} req/s  ({throughput / baseline:.2f}x, {errors} errors){note}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
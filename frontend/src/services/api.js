@@ -43,16 +43,34 @@ export const parkingAPI = {
   // Parking requests
   createParkingRequest: (requestData) => api.post('/parking-requests', requestData),
   getParkingRequests: (status) => api.get(`/parking-requests${status ? `?status=${status}` : ''}`),
+  getParkingRequestsColumnar: (status) =>
+    api.get('/parking-requests', { params: { format: 'columnar', ...(status ? { status } : {}) } }),
   getUserRequests: (empId) => api.get(`/parking-requests/user/${empId}`),
+  searchRequests: (q, limit = 20, offset = 0) => api.get('/search', { params: { q, limit, offset } }),
 
   // Admin operations
   adminLogin: (credentials) => api.post('/admin/login', credentials),
   approveRejectRequest: (approvalData) => api.post('/admin/approve-request', approvalData),
   getDashboard: () => api.get('/admin/dashboard'),
+  allocateDay: (date, vehicleType, { officeId = 'default-office', dryRun = false } = {}) =>
+    api.post('/admin/allocate', { date, vehicle_type: vehicleType, office_id: officeId, dry_run: dryRun }),
 
   // OTP operations
   sendOTP: (email) => api.post('/send-otp', { email }),
   verifyOTP: (email, otp) => api.post('/verify-otp', { email, otp }),
 };
 
+// Expand a `format=columnar` listing back into the row objects getParkingRequests returns
+export const expandColumnarRequests = ({ columns, rows, users, offices }) =>
+  rows.map((row) => {
+    const request = Object.fromEntries(columns.map((column, i) => [column, row[i]]));
+    const [userName, userEmail] = users[request.user_id] || ['Unknown', 'Unknown'];
+    return {
+      ...request,
+      user_name: userName,
+      user_email: userEmail,
+      office_name: offices[request.office_id] || 'Unknown',
+    };
+  });
+
 export default api;
\ No newline at end of file
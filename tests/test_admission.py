@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected
+
+from .conftest import booking
+
+BOOKING = booking()
+
+
+async def hold(controller, key, entered, release, order=None):
+    async with controller.admit(key):
+        if order is not None:
+            order.append(key)
+        entered.set()
+        await release.wait()
+
+
+def test_rate_limited_client_gets_429_with_retry_after(client, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "booking_admission", AdmissionController(rate=0.5, burst=1))
+    assert client.post("/api/parking-requests", json=BOOKING).status_code == 200
+    limited = client.post("/api/parking-requests", json={**BOOKING, "parking_date": "2030-01-02"})
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "2"
+    # Buckets are per client
+    other = {**BOOKING, "emp_id": "EMP002", "email": "other@company.com", "vehicle_number": "KA01"}
+    assert client.post("/api/parking-requests", json=other).status_code == 200
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queued=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(controller, "a", entered, release))
+        await entered.wait()
+        waiter = asyncio.create_task(hold(controller, "b", asyncio.Event(), release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("c"):
+                pass
+        assert rejected.value.retry_after > 0
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return controller.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert (snapshot["admitted"], snapshot["queued"], snapshot["queue_full"]) == (2, 1, 1)
+    assert (snapshot["active"], snapshot["waiting"]) == (0, 0)
+
+
+def test_waiters_are_served_round_robin_across_clients():
+    async def scenario():
+        controller = AdmissionController(burst=10, max_concurrent=1)
+        entered, release, order = asyncio.Event(), asyncio.Event(), []
+        holder = asyncio.create_task(hold(controller, "first", entered, release, order))
+        await entered.wait()
+        # One client floods the queue before another submits once
+        waiters = [asyncio.create_task(hold(controller, key, asyncio.Event(), release, order))
+                   for key in ("flood", "flood", "flood", "single")]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "flood", "single", "flood", "flood"]
+
+
+def test_cancelled_waiters_give_up_their_place_or_their_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1)
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold(controller, "a", entered, release))
+        await entered.wait()
+
+        # Cancelled while still queued: it simply leaves the queue
+        gone = asyncio.create_task(hold(controller, "b", asyncio.Event(), release))
+        await asyncio.sleep(0)
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+        assert controller.snapshot()["waiting"] == 0
+
+        # Cancelled just as the slot is handed to it: the slot moves on to the next waiter
+        unlucky_entered, next_entered = asyncio.Event(), asyncio.Event()
+        unlucky = asyncio.create_task(hold(controller, "c", unlucky_entered, release))
+        following = asyncio.create_task(hold(controller, "d", next_entered, asyncio.Event()))
+        await asyncio.sleep(0)
+        release.set()
+        # One turn of the loop: the holder leaves and hands its slot over, but "c" has not resumed yet
+        await asyncio.sleep(0)
+        assert holder.done()
+        unlucky.cancel()
+        await asyncio.gather(unlucky, return_exceptions=True)
+        await asyncio.wait_for(next_entered.wait(), timeout=1)
+        assert not unlucky_entered.is_set()
+        assert controller.snapshot()["active"] == 1
+        following.cancel()
+        await asyncio.gather(following, return_exceptions=True)
+        return controller.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert (snapshot["active"], snapshot["waiting"]) == (0, 0)
+
+
+def test_default_limits_are_split_across_workers(monkeypatch):
+    monkeypatch.setattr(admission, "WORKERS", 4)
+    controller = AdmissionController()
+    assert controller.rate == admission.CLIENT_RATE_PER_SECOND / 4
+    assert controller.burst == max(1, admission.CLIENT_BURST / 4)
+    assert controller.max_concurrent == admission.MAX_CONCURRENT_WRITES // 4
+    assert controller.max_queued == admission.MAX_QUEUED_WRITES // 4
+    assert controller.snapshot()["workers"] == 4
+
+    monkeypatch.setattr(admission, "WORKERS", 64)
+    controller = AdmissionController()
+    assert (controller.burst, controller.max_concurrent) == (1, 1)
@@ -0,0 +1,47 @@
+from allocation import plan_allocation, shift_mask
+
+
+def test_shifts_without_overlap_share_a_slot():
+    assert shift_mask("morning") & shift_mask("night") == 0
+    assert shift_mask("evening") & shift_mask("night") == 0
+    assert shift_mask("morning") & shift_mask("evening")
+
+    requests = [{"team": "a", "shift": "morning"}, {"team": "a", "shift": "evening"}, {"team": "a", "shift": "night"}]
+    assert plan_allocation(requests, capacity=1) == [0, None, 0]
+
+
+def test_heavy_past_usage_yields_to_other_teams():
+    requests = [{"team": "core", "shift": "morning"}] * 3 + [{"team": "infra", "shift": "morning"}]
+
+    assert plan_allocation(requests, capacity=1) == [0, None, None, None]
+    assert plan_allocation(requests, capacity=1, team_usage={"core": 40, "infra": 0}) == [None, None, None, 0]
+    # Without history the teams still alternate rather than first-come-first-served
+    assert plan_allocation(requests, capacity=2) == [0, None, None, 1]
+
+
+def test_allocate_endpoint_shares_slots_and_sweeper_frees_them_once(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 1, available_car_slots = 1")
+    for i, shift in enumerate(("morning", "evening", "night")):
+        response = client.post("/api/parking-requests", json={
+            "emp_id": f"E{i}", "name": f"User {i}", "email": f"u{i}@company.com", "phone": "1",
+            "team": "ops", "shift": shift, "vehicle_type": "car", "vehicle_number": f"KA0{i}",
+            "parking_date": "2030-01-01",
+        })
+        assert response.status_code == 200
+
+    preview = client.post("/api/admin/allocate", json={"date": "2030-01-01", "vehicle_type": "car", "dry_run": True})
+    assert preview.json()["slots_used"] == 1
+    assert app_db.execute_query("SELECT COUNT(*) AS n FROM parking_requests WHERE status = 'approved'")[0]["n"] == 0
+
+    result = client.post("/api/admin/allocate", json={"date": "2030-01-01", "vehicle_type": "car"}).json()
+    assert sorted(a["shift"] for a in result["allocated"]) == ["morning", "night"]
+    assert {a["slot_number"] for a in result["allocated"]} == {"C-1"}
+    assert result["shared_slots"] == 1 and len(result["waitlisted"]) == 1
+    assert app_db.execute_query("SELECT available_car_slots FROM offices")[0]["available_car_slots"] == 0
+
+    from events import rebuild_office_availability
+    assert rebuild_office_availability()[0]["available_car_slots"] == 0
+
+    from sweeper import sweep_expired_requests
+    assert sweep_expired_requests(today="2030-01-02") == 1
+    assert app_db.execute_query("SELECT available_car_slots FROM offices")[0]["available_car_slots"] == 1
@@ -0,0 +1,84 @@
+from analytics import compute_daily_rollups, query_analytics, refresh_rollups
+from events import compact_events
+
+from .conftest import book, decide
+
+FAR_FUTURE = "2100-01-01"
+
+
+def row(status, first_day, last_day=None, team="core", shift="morning", vehicle_type="car"):
+    return {"office_id": "o", "vehicle_type": vehicle_type, "status": status, "first_day": first_day,
+            "last_day": last_day, "team": team, "shift": shift}
+
+
+def test_rollups_expand_ranges_and_count_occupying_statuses():
+    rows = [
+        row("approved", "2030-01-01", "2030-01-03"),
+        row("pending", "2030-01-02"),
+        # A range ending before it starts covers its first day only
+        row("expired", "2030-01-05", "2030-01-04", team="infra"),
+        row("rejected", "not-a-date"),
+    ]
+    assert sorted(compute_daily_rollups(rows)) == [
+        ("2030-01-01", "o", "car", "core", "morning", 1, 1),
+        ("2030-01-02", "o", "car", "core", "morning", 1, 2),
+        ("2030-01-03", "o", "car", "core", "morning", 1, 1),
+        ("2030-01-05", "o", "car", "infra", "morning", 1, 1),
+    ]
+    assert [rollup[0] for rollup in compute_daily_rollups(rows, "2030-01-02", "2030-01-03")] == [
+        "2030-01-02", "2030-01-03"
+    ]
+    assert compute_daily_rollups([]) == []
+
+
+def test_refresh_folds_only_new_events(client):
+    first = book(client, "E1", "2030-01-01")
+    refresh_rollups()
+    assert query_analytics("2030-01-01", "2030-01-01")[0]["occupied"] == 0
+
+    assert refresh_rollups() == 0
+    decide(client, first, "approved")
+    assert refresh_rollups() == 1
+    assert query_analytics("2030-01-01", "2030-01-01")[0]["occupied"] == 1
+
+
+def test_query_analytics_groups_and_reports_utilisation(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 4, total_bike_slots = 0")
+    decide(client, book(client, "E1", "2030-01-01", team="core"), "approved")
+    decide(client, book(client, "E2", "2030-01-02", team="infra"), "approved")
+    book(client, "E3", "2030-01-02", team="infra")
+    refresh_rollups()
+
+    by_day = query_analytics("2030-01-01", "2030-01-02")
+    assert [(r["period"], r["occupied"], r["requested"], r["capacity"]) for r in by_day] == [
+        ("2030-01-01", 1, 1, 4), ("2030-01-02", 1, 2, 4)
+    ]
+    assert by_day[0]["utilisation"] == 25.0
+
+    by_team = query_analytics("2030-01-01", "2030-01-02", group_by="team")
+    assert {r["period"]: (r["occupied"], r["requested"]) for r in by_team} == {"core": (1, 1), "infra": (1, 2)}
+    assert "utilisation" not in by_team[0]
+    assert query_analytics("2030-01-01", "2030-01-02", vehicle_type="bike") == []
+
+
+def test_compaction_keeps_events_the_rollups_have_not_read(client, app_db):
+    first = book(client, "E1", "2030-01-01")
+    refresh_rollups()
+    rolled_up = app_db.execute_query("SELECT MAX(id) AS id FROM request_events")[0]["id"]
+
+    decide(client, first, "approved")
+    result = compact_events(FAR_FUTURE)
+    assert result["compacted_events"] == rolled_up
+    remaining = app_db.execute_query("SELECT id FROM request_events")
+    assert remaining and all(event["id"] > rolled_up for event in remaining)
+
+    # The approval is still there for the incremental refresh to pick up
+    assert refresh_rollups() == 1
+    assert query_analytics("2030-01-01", "2030-01-01")[0]["occupied"] == 1
+    assert compact_events(FAR_FUTURE)["compacted_events"] == len(remaining)
+
+
+def test_bad_dates_are_400(client):
+    assert client.get("/api/admin/analytics", params={"end": "garbage"}).status_code == 400
+    assert client.get("/api/admin/analytics", params={"start": "garbage", "end": "2030-01-01"}).status_code == 400
+    assert client.get("/api/admin/analytics", params={"end": "2030-01-31"}).json()["start"] == "2030-01-01"
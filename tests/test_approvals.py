@@ -0,0 +1,48 @@
+from .conftest import book, decide
+
+
+def state(app_db, request_id):
+    request = app_db.execute_query("SELECT status, slot_number FROM parking_requests WHERE id = ?", (request_id,))[0]
+    available = app_db.execute_query("SELECT available_car_slots FROM offices")[0]["available_car_slots"]
+    return request["status"], request["slot_number"], available
+
+
+def test_approving_twice_keeps_one_slot(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 50, available_car_slots = 50")
+    request_id = book(client, "E1")
+    decide(client, request_id, "approved")
+    assert state(app_db, request_id) == ("approved", "C-1", 49)
+    events = len(app_db.execute_query("SELECT id FROM request_events"))
+
+    decide(client, request_id, "approved")
+    assert state(app_db, request_id) == ("approved", "C-1", 49)
+    assert len(app_db.execute_query("SELECT id FROM request_events")) == events
+
+
+def test_leaving_approved_returns_the_slot(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 50, available_car_slots = 50")
+    rejected, waitlisted = book(client, "E1"), book(client, "E2")
+    decide(client, rejected, "approved")
+    decide(client, waitlisted, "approved")
+    assert state(app_db, waitlisted)[2] == 48
+
+    decide(client, rejected, "rejected")
+    assert state(app_db, rejected) == ("rejected", None, 49)
+    decide(client, waitlisted, "waitlist")
+    assert state(app_db, waitlisted) == ("waitlist", None, 50)
+
+    # Approving again takes the lowest free slot once more
+    decide(client, rejected, "approved")
+    assert state(app_db, rejected) == ("approved", "C-1", 49)
+
+
+def test_a_shared_slot_stays_held_by_the_other_shift(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 5, available_car_slots = 5")
+    morning, night = book(client, "E1"), book(client, "E2")
+    decide(client, morning, "approved")
+    app_db.execute_update("UPDATE parking_requests SET status = 'approved', slot_number = 'C-1' WHERE id = ?", (night,))
+
+    decide(client, morning, "rejected")
+    assert state(app_db, morning) == ("rejected", None, 4)
+    decide(client, night, "rejected")
+    assert state(app_db, night) == ("rejected", None, 5)
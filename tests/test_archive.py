@@ -0,0 +1,52 @@
+from archive import archive_closed_requests
+
+from .conftest import insert_request
+
+OLD = "2020-01-01T00:00:00+00:00"
+RECENT = "2999-01-01T00:00:00+00:00"
+
+
+def test_closed_requests_move_to_archive_in_batches(client, app_db):
+    insert_request(app_db, "old-rejected", "rejected", day="2020-01-01", created_at=OLD, updated_at=OLD)
+    insert_request(app_db, "old-expired", "expired", day="2020-01-01", created_at=OLD, updated_at=OLD)
+    insert_request(app_db, "old-approved", "approved", day="2020-01-01", created_at=OLD, updated_at=OLD)
+    insert_request(app_db, "new-rejected", "rejected", day="2020-01-01", created_at=OLD, updated_at=RECENT)
+    before = client.get("/api/admin/dashboard").json()["request_counts"]
+
+    assert archive_closed_requests(retention_days=30, batch_size=1) == 2
+
+    live = {row["id"] for row in app_db.execute_query("SELECT id FROM parking_requests")}
+    archived = {row["id"] for row in app_db.execute_query("SELECT id FROM parking_requests_archive")}
+    assert live == {"old-approved", "new-rejected"}
+    assert archived == {"old-rejected", "old-expired"}
+    assert len(app_db.execute_query("SELECT id FROM all_parking_requests")) == 4
+    assert client.get("/api/admin/dashboard").json()["request_counts"] == before
+
+    # Listings of closed statuses agree with the dashboard
+    for status in ("rejected", "expired"):
+        listed = client.get("/api/parking-requests", params={"status": status}).json()
+        assert len(listed) == before[status]
+    assert {r["id"] for r in client.get("/api/parking-requests", params={"status": "rejected"}).json()} == {
+        "old-rejected", "new-rejected"
+    }
+    columnar = client.get("/api/parking-requests", params={"status": "expired", "format": "columnar"}).json()
+    assert len(columnar["rows"]) == 1
+    assert archive_closed_requests(retention_days=30) == 0
+
+
+def test_archive_lookup_seeks_status_and_age(app_db):
+    conn = app_db.connect()
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM parking_requests WHERE status IN (?, ?) AND updated_at < ? LIMIT ?",
+        ("rejected", "expired", OLD, 10)
+    ))
+    conn.close()
+    assert "(status=? AND updated_at<?)" in plan
+
+
+def test_archive_endpoint_bounds_retention(client):
+    assert client.post("/api/admin/archive", params={"retention_days": -1}).status_code == 422
+    assert client.post("/api/admin/archive", params={"retention_days": 10 ** 7}).status_code == 422
+    assert client.post("/api/admin/archive", params={"retention_days": 36500}).json() == {
+        "archived": 0, "retention_days": 36500
+    }
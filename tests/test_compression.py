@@ -0,0 +1,104 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+import compression
+from compression import choose_encoding
+
+from .conftest import booking
+
+
+def test_negotiation(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("br") is None
+    assert choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("") is None
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+
+
+def test_latin1_header_bytes_are_accepted():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain"), (b"x-owner", "José".encode("latin-1"))]})
+        await send({"type": "http.response.body", "body": b"x" * 2048})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip"), (b"x-name", "José".encode("latin-1"))]}
+    asyncio.run(compression.CompressionMiddleware(app)(scope, None, send))
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"x-owner"] == "José".encode("latin-1")
+    assert gzip.decompress(sent[1]["body"]) == b"x" * 2048
+
+
+def test_only_large_responses_are_compressed(client):
+    small = client.get("/api/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert "Accept-Encoding" in small.headers["vary"]
+
+    for i in range(10):
+        client.post("/api/parking-requests", json=booking(f"EMP{i:03d}"))
+    large = client.get("/api/parking-requests", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert int(large.headers["content-length"]) < len(large.content)
+    assert len(large.json()) == 10
+
+
+def test_brotli_is_preferred_when_accepted(client):
+    pytest.importorskip("brotli")
+    for i in range(10):
+        client.post("/api/parking-requests", json=booking(f"EMP{i:03d}"))
+    response = client.get("/api/parking-requests", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    # httpx decodes br itself once brotli is installed
+    assert len(response.json()) == 10
+
+
+def test_vary_is_appended_to_cors_and_set_on_identity(client):
+    for i in range(10):
+        client.post("/api/parking-requests", json=booking(f"EMP{i:03d}"))
+    origin = {"Origin": "http://localhost:3000"}
+
+    compressed = client.get("/api/parking-requests", headers={**origin, "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    vary = [value.strip() for value in compressed.headers["vary"].split(",")]
+    assert "Origin" in vary and "Accept-Encoding" in vary
+
+    identity = client.get("/api/parking-requests", headers={**origin, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    vary = [value.strip() for value in identity.headers["vary"].split(",")]
+    assert "Origin" in vary and "Accept-Encoding" in vary
+
+
+def test_columnar_listing_carries_the_row_format(client):
+    for i in range(3):
+        client.post("/api/parking-requests", json=booking(f"EMP{i:03d}"))
+    client.post("/api/parking-requests", json=booking("EMP009", "2030-01-02"))
+    rows = client.get("/api/parking-requests").json()
+    columnar = client.get("/api/parking-requests", params={"format": "columnar"}).json()
+    assert columnar["format"] == "columnar"
+    assert all(len(row) == len(columnar["columns"]) for row in columnar["rows"])
+
+    # The same expansion the frontend does: zip the columns, then resolve users and offices
+    expanded = []
+    for values in columnar["rows"]:
+        request = dict(zip(columnar["columns"], values))
+        user_name, user_email = columnar["users"].get(request["user_id"], ["Unknown", "Unknown"])
+        expanded.append({**request, "user_name": user_name, "user_email": user_email,
+                         "office_name": columnar["offices"].get(request["office_id"], "Unknown")})
+
+    by_id = lambda requests: sorted(requests, key=lambda request: request["id"])
+    assert by_id(expanded) == by_id(rows)
@@ -0,0 +1,58 @@
+from analytics import refresh_rollups
+from events import compact_events, get_events, rebuild_office_availability, _seed_snapshots
+
+from .conftest import book, decide, insert_request
+
+FAR_FUTURE = "2100-01-01"
+
+
+def snapshots(app_db):
+    return {row["request_id"]: row["status"]
+            for row in app_db.execute_query("SELECT request_id, status FROM request_event_snapshots")}
+
+
+def test_compaction_folds_history_into_latest_status(client, app_db):
+    approved, rejected = book(client, "E1"), book(client, "E2")
+    decide(client, approved, "approved")
+    decide(client, rejected, "rejected")
+    refresh_rollups()
+    events = len(get_events())
+
+    assert compact_events("2000-01-01") == {"compacted_events": 0, "snapshots": 0}
+    result = compact_events(FAR_FUTURE)
+    assert result == {"compacted_events": events, "snapshots": 2}
+    assert get_events() == []
+    assert snapshots(app_db) == {approved: "approved", rejected: "rejected"}
+
+
+def test_requests_older_than_the_event_log_get_seed_snapshots(client, app_db):
+    logged = book(client, "E1")
+    insert_request(app_db, "legacy", vehicle_number="KA99", slot_number="C-9", created_at="then", updated_at="then")
+    with app_db.transaction() as conn:
+        _seed_snapshots(conn)
+        _seed_snapshots(conn)
+    seeded = app_db.execute_query("SELECT * FROM request_event_snapshots")
+    assert [(row["request_id"], row["status"], row["last_event_id"]) for row in seeded] == [("legacy", "approved", 0)]
+    assert logged not in snapshots(app_db)
+
+
+def test_rebuild_counts_shared_slots_once_across_snapshots_and_events(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 5, available_car_slots = 5")
+    morning, night, other = (book(client, "E1", shift="morning"), book(client, "E2", shift="night"),
+                            book(client, "E3", shift="morning"))
+    decide(client, morning, "approved")
+    refresh_rollups()
+    compact_events(FAR_FUTURE)
+
+    # After compaction: one approval lives only in a snapshot, the rest in newer events
+    decide(client, night, "approved")
+    decide(client, other, "approved")
+    app_db.execute_update("UPDATE parking_requests SET slot_number = 'C-1' WHERE id IN (?, ?)", (morning, night))
+    app_db.execute_update("UPDATE parking_requests SET slot_number = 'C-2' WHERE id = ?", (other,))
+    app_db.execute_update("UPDATE offices SET available_car_slots = 0")
+
+    office = next(o for o in rebuild_office_availability() if o["office_id"] == "default-office")
+    assert office["available_car_slots"] == 3
+    assert app_db.execute_query(
+        "SELECT available_car_slots FROM offices WHERE id = 'default-office'"
+    )[0]["available_car_slots"] == 3
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from .conftest import booking
+
+PARKING_REQUEST = booking()
+
+
+@pytest.fixture
+def connections(app_db, monkeypatch):
+    """Count database connections opened by request handlers.
+
+    Background jobs run in worker threads without an event loop, so they
+    are left out of the count.
+    """
+    opened = []
+    connect = app_db.connect
+
+    def counting_connect():
+        try:
+            asyncio.get_running_loop()
+            opened.append(1)
+        except RuntimeError:
+            pass
+        return connect()
+
+    monkeypatch.setattr(app_db, "connect", counting_connect)
+    return opened
+
+
+@pytest.mark.parametrize("path", ["/api/offices", "/api/admin/dashboard", "/api/parking-requests/user/EMP001"])
+def test_revalidation_skips_queries(client, connections, path):
+    client.post("/api/parking-requests", json=PARKING_REQUEST)
+
+    connections.clear()
+    first = client.get(path)
+    full_cost = len(connections)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "private, no-cache"
+    etag = first.headers["etag"]
+
+    connections.clear()
+    revalidated = client.get(path, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    # Only the change-counter lookup runs
+    assert len(connections) == 1
+    assert full_cost > len(connections)
+
+
+
+def test_last_modified_never_hides_a_write_in_the_same_second(client, app_db):
+    client.post("/api/parking-requests", json=PARKING_REQUEST)
+    app_db.execute_update("UPDATE cache_versions SET updated_at = '2020-01-01T00:00:00.250'")
+    first = client.get("/api/offices")
+    # Rounded up: the whole second has passed, so nothing later can share it
+    assert first.headers["last-modified"] == "Wed, 01 Jan 2020 00:00:01 GMT"
+    assert client.get("/api/offices", headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+
+    app_db.execute_update("UPDATE cache_versions SET updated_at = '2020-01-01T00:00:01.000' WHERE name = 'offices'")
+    assert client.get("/api/offices", headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 200
+
+    # A change in a second still running is advertised rounded down, which never validates
+    app_db.execute_update(
+        "UPDATE cache_versions SET updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now', '+2 seconds') "
+        "WHERE name = 'offices'"
+    )
+    fresh = client.get("/api/offices").headers["last-modified"]
+    assert client.get("/api/offices", headers={"If-Modified-Since": fresh}).status_code == 200
+
+
+def test_writes_change_the_etag(client):
+    client.post("/api/parking-requests", json=PARKING_REQUEST)
+    etag = client.get("/api/admin/dashboard").headers["etag"]
+
+    request_id = client.get("/api/parking-requests").json()[0]["id"]
+    client.post("/api/admin/approve-request", json={"request_id": request_id, "status": "approved"})
+
+    response = client.get("/api/admin/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["request_counts"]["approved"] == 1
+
+
+def test_unknown_user_is_still_404(client):
+    assert client.get("/api/parking-requests/user/NOPE").status_code == 404
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import idempotency
+from idempotency import IdempotencyError, begin, complete, lookup
+
+from .conftest import booking
+
+BOOKING = booking()
+
+
+def test_retry_replays_the_stored_response(client, app_db):
+    first = client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"})
+    retry = client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"})
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(app_db.execute_query("SELECT id FROM parking_requests")) == 1
+
+
+def test_replay_skips_admission_control(client, monkeypatch):
+    import server
+    from admission import AdmissionController
+    monkeypatch.setattr(server, "booking_admission", AdmissionController(rate=0.001, burst=1))
+    assert client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"}).status_code == 200
+    assert client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"}).status_code == 200
+    assert client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k2"}).status_code == 429
+
+
+def test_reuse_with_a_different_body_is_422(client):
+    client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"})
+    response = client.post("/api/parking-requests", json={**BOOKING, "parking_date": "2030-01-02"},
+                           headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 422
+
+
+def test_in_flight_key_is_409_until_its_lease_expires(app_db):
+    assert begin("k1", "endpoint", {"a": 1}) is None
+    with pytest.raises(IdempotencyError) as error:
+        begin("k1", "endpoint", {"a": 1})
+    assert error.value.status_code == 409
+    assert lookup("k1", "endpoint", {"a": 1}) is None
+
+    # The owner crashed: once the lease has run out a retry takes the key over
+    stale = (datetime.now(timezone.utc) - idempotency.CLAIM_LEASE * 2).isoformat()
+    app_db.execute_update("UPDATE idempotency_keys SET claimed_at = ?", (stale,))
+    assert begin("k1", "endpoint", {"a": 1}) is None
+    with pytest.raises(IdempotencyError):
+        begin("k1", "endpoint", {"a": 1})
+
+    complete("k1", "endpoint", 200, {"ok": True})
+    assert begin("k1", "endpoint", {"a": 1}) == {"status_code": 200, "body": {"ok": True}}
+    assert lookup("k1", "endpoint", {"a": 1}) == {"status_code": 200, "body": {"ok": True}}
+
+
+def test_failed_request_releases_its_key(client, app_db):
+    client.post("/api/parking-requests", json={**BOOKING, "emp_id": "EMP002", "email": "other@company.com"})
+    failed = client.post("/api/parking-requests", json=BOOKING, headers={"Idempotency-Key": "k1"})
+    assert failed.status_code == 409
+    assert app_db.execute_query("SELECT key FROM idempotency_keys") == []
+
+    retry = client.post("/api/parking-requests", json={**BOOKING, "parking_date": "2030-01-05"},
+                        headers={"Idempotency-Key": "k1"})
+    assert retry.status_code == 200
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import notifications
+from notifications import NotificationDispatcher, SMTPSender, enqueue
+
+
+class SMTPSink:
+    """Just enough of an SMTP server to accept and keep messages."""
+
+    def __init__(self):
+        self.messages = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        writer.write(b"220 sink ready\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                writer.write(b"250 sink\r\n")
+            elif command == "DATA":
+                writer.write(b"354 end with .\r\n")
+                await writer.drain()
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += await reader.readline()
+                self.messages.append(data.decode())
+                writer.write(b"250 queued\r\n")
+            elif command == "QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+
+class FailingSender:
+    async def send(self, message):
+        raise ConnectionError("smtp down")
+
+
+@pytest.fixture
+def outbox_db(temp_db, monkeypatch):
+    monkeypatch.setattr(notifications, 'db', temp_db)
+    return temp_db
+
+
+def queue(db, count=1):
+    with db.transaction() as conn:
+        for i in range(count):
+            enqueue(conn, "otp", f"user{i}@company.com", "Your OTP", f"Your OTP is {i:06d}")
+
+
+def test_dispatcher_delivers_outbox_to_smtp(outbox_db):
+    async def scenario():
+        sink = SMTPSink()
+        port = await sink.start()
+        try:
+            queue(outbox_db, 3)
+            dispatcher = NotificationDispatcher(sender=SMTPSender('127.0.0.1', port), max_concurrency=2)
+            assert await dispatcher.dispatch_once() == 3
+            assert await dispatcher.dispatch_once() == 0
+        finally:
+            await sink.stop()
+        return sink.messages
+
+    messages = asyncio.run(scenario())
+    assert len(messages) == 3
+    assert any("Your OTP is 000002" in message for message in messages)
+    statuses = outbox_db.execute_query("SELECT status, sent_at FROM notification_outbox")
+    assert all(row["status"] == "sent" and row["sent_at"] for row in statuses)
+
+
+def test_failed_delivery_backs_off_then_gives_up(outbox_db):
+    queue(outbox_db)
+    dispatcher = NotificationDispatcher(sender=FailingSender(), max_attempts=2)
+
+    assert asyncio.run(dispatcher.dispatch_once()) == 1
+    row = outbox_db.execute_query("SELECT * FROM notification_outbox")[0]
+    assert row["status"] == "pending"
+    assert row["attempts"] == 1
+    assert row["last_error"] == "smtp down"
+    assert row["next_attempt_at"] > datetime.now(timezone.utc).isoformat()
+
+    # Not due yet, so nothing is claimed
+    assert asyncio.run(dispatcher.dispatch_once()) == 0
+
+    outbox_db.execute_update("UPDATE notification_outbox SET next_attempt_at = ?", ("2000-01-01",))
+    asyncio.run(dispatcher.dispatch_once())
+    row = outbox_db.execute_query("SELECT * FROM notification_outbox")[0]
+    assert row["status"] == "failed"
+    assert row["attempts"] == 2
+
+
+def test_rolled_back_change_sends_nothing(outbox_db):
+    with pytest.raises(RuntimeError):
+        with outbox_db.transaction() as conn:
+            enqueue(conn, "approval", "user@company.com", "Approved", "Slot C-1")
+            raise RuntimeError("approval failed")
+    assert outbox_db.execute_query("SELECT * FROM notification_outbox") == []
@@ -0,0 +1,53 @@
+import logging
+import sqlite3
+
+from profiler import ProfilingConnection, fingerprint
+
+
+def test_fingerprint_folds_literals_and_in_lists():
+    assert (fingerprint("SELECT *  FROM t WHERE a = 'x''y' AND b IN (?, ?, ?) LIMIT 10")
+            == fingerprint("SELECT * FROM t\n WHERE a = 'z' AND b IN (?) LIMIT 5")
+            == "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?")
+
+
+def test_profiler_records_statements_and_logs_slow_plans(temp_db, caplog):
+    temp_db.disable_profiling()
+    temp_db.ensure_schema()
+    assert type(temp_db.connect()) is sqlite3.Connection
+
+    profiler = temp_db.enable_profiling(slow_query_ms=0)
+    assert isinstance(temp_db.connect(), ProfilingConnection)
+    for emp_id in ("E1", "E2"):
+        temp_db.execute_update(
+            "INSERT INTO users (id, emp_id, name, email, phone, created_at) VALUES (?, ?, 'n', 'e', 'p', 'now')",
+            (emp_id, emp_id)
+        )
+    with caplog.at_level(logging.WARNING, logger="profiler"):
+        rows = temp_db.execute_query("SELECT * FROM users WHERE emp_id = ?", ("E1",))
+    assert len(rows) == 1
+
+    stats = {entry["statement"]: entry for entry in profiler.top(limit=50)}
+    insert = stats["INSERT INTO users (id, emp_id, name, email, phone, created_at) VALUES (...)"]
+    select = stats["SELECT * FROM users WHERE emp_id = ?"]
+    assert (insert["calls"], insert["rows"]) == (2, 2)
+    assert (select["calls"], select["rows"], select["slow_calls"]) == (1, 1, 1)
+    assert "SEARCH users USING INDEX" in caplog.text
+
+    temp_db.disable_profiling()
+    temp_db.execute_query("SELECT * FROM users")
+    assert "SELECT * FROM users" not in {entry["statement"] for entry in profiler.top(limit=50)}
+
+
+def test_admin_endpoints_toggle_profiling(client, app_db):
+    original = app_db.profiler
+    app_db.disable_profiling()
+    assert client.get("/api/admin/query-stats").json()["enabled"] is False
+    try:
+        client.post("/api/admin/query-profiling", json={"enabled": True, "reset": True})
+        client.get("/api/offices")
+        statements = client.get("/api/admin/query-stats?order_by=calls").json()["statements"]
+        assert any("cache_versions" in entry["statement"] for entry in statements)
+        client.post("/api/admin/query-profiling", json={"enabled": False})
+        assert client.get("/api/admin/query-stats").json()["statements"] == []
+    finally:
+        app_db.profiler = original
@@ -0,0 +1,63 @@
+from search import build_match_query
+
+from .conftest import book
+
+
+def test_match_query_quotes_every_token():
+    assert build_match_query("TN-09") == '"TN"* "09"*'
+    assert build_match_query("o'brien") == '"o"* "brien"*'
+    assert build_match_query('NEAR(a b) OR "x') == '"NEAR"* "a"* "b"* "OR"* "x"*'
+    assert build_match_query("--") is None
+    assert build_match_query(None) is None
+
+
+def test_fts_syntax_in_queries_is_harmless(client):
+    book(client, "E1", name="Priya Raman", vehicle_number="KA01")
+    for q in ('NEAR(priya', '"priya', "priya*", "-priya", "priya OR"):
+        assert client.get("/api/search", params={"q": q}).status_code == 200
+    assert client.get("/api/search", params={"q": "--"}).json() == {"query": "--", "total": 0, "results": []}
+
+
+def test_owner_matches_rank_above_description_matches(client):
+    noted = book(client, "E1", name="Arun Kumar", vehicle_number="KA01", description="carpools with priya")
+    owned = book(client, "E2", name="Priya Raman", vehicle_number="KA02")
+    results = client.get("/api/search", params={"q": "priya"}).json()["results"]
+    assert [result["id"] for result in results] == [owned, noted]
+    assert results[0]["user_name"] == "Priya Raman"
+
+    # Prefix and normalised vehicle numbers both match
+    assert [r["id"] for r in client.get("/api/search", params={"q": "pri ram"}).json()["results"]] == [owned]
+    assert [r["id"] for r in client.get("/api/search", params={"q": "ka02"}).json()["results"]] == [owned]
+
+
+def test_pagination(client):
+    ids = {book(client, f"E{i}", name=f"Team Member {i}", vehicle_number=f"KA{i:02d}") for i in range(5)}
+    first = client.get("/api/search", params={"q": "member", "limit": 2}).json()
+    second = client.get("/api/search", params={"q": "member", "limit": 2, "offset": 2}).json()
+    last = client.get("/api/search", params={"q": "member", "limit": 2, "offset": 4}).json()
+    assert first["total"] == second["total"] == last["total"] == 5
+    assert [len(page["results"]) for page in (first, second, last)] == [2, 2, 1]
+    assert {r["id"] for page in (first, second, last) for r in page["results"]} == ids
+
+
+def test_index_survives_vacuum(client, app_db):
+    kept = [book(client, f"E{i}", name=f"Person {i}", vehicle_number=f"KA{i:02d}") for i in range(4)]
+    app_db.execute_update("DELETE FROM parking_requests WHERE id IN (?, ?)", (kept[0], kept[2]))
+    conn = app_db.connect()
+    conn.execute("VACUUM")
+    conn.close()
+
+    results = client.get("/api/search", params={"q": "person 3"}).json()["results"]
+    assert [(r["id"], r["vehicle_number"]) for r in results] == [(kept[3], "KA03")]
+
+    app_db.execute_update("UPDATE parking_requests SET description = 'night shift' WHERE id = ?", (kept[1],))
+    assert [r["id"] for r in client.get("/api/search", params={"q": "night"}).json()["results"]] == [kept[1]]
+    assert client.get("/api/search", params={"q": "person"}).json()["total"] == 2
+
+
+def test_rowid_keyed_index_is_rebuilt_on_upgrade(client, app_db):
+    request_id = book(client, "E1", name="Priya Raman", vehicle_number="KA01")
+    app_db.execute_update("DROP TABLE request_search_docs")
+    app_db.execute_update("PRAGMA user_version = 4")
+    app_db._schema_ready = False
+    assert [r["id"] for r in client.get("/api/search", params={"q": "priya"}).json()["results"]] == [request_id]
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import VersionedCache
+
+EMAIL = "rajesh.kumar@company.com"
+
+
+def send_otp(client):
+    response = client.post("/api/send-otp", json={"email": EMAIL})
+    assert response.status_code == 200
+    return response.json()["otp"]
+
+
+def verify(client, otp):
+    return client.post("/api/verify-otp", json={"email": EMAIL, "otp": otp})
+
+
+def test_wrong_guess_keeps_the_code_and_a_used_code_is_gone(client):
+    otp = send_otp(client)
+    wrong = "000000" if otp != "000000" else "111111"
+    assert verify(client, wrong).json()["detail"] == "Invalid OTP"
+    assert verify(client, otp).status_code == 200
+    assert verify(client, otp).json()["detail"] == "OTP not found or expired"
+
+
+def test_expired_code_is_rejected_and_dropped(client, app_db):
+    otp = send_otp(client)
+    app_db.execute_update("UPDATE otp_codes SET expires_at = '2020-01-01T00:00:00+00:00'")
+    assert verify(client, otp).json()["detail"] == "OTP expired"
+    assert app_db.execute_query("SELECT email FROM otp_codes") == []
+
+
+def test_code_is_single_use_across_concurrent_verifications(client):
+    otp = send_otp(client)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda _: verify(client, otp).status_code, range(8)))
+    assert sorted(statuses) == [200] + [400] * 7
+
+
+def test_code_sent_by_one_worker_verifies_on_another(client, app_db):
+    otp = send_otp(client)
+    # Another worker process: its own engine and connections on the same database
+    other = type(app_db)(app_db.db_path)
+    assert other.execute_query("SELECT otp FROM otp_codes WHERE email = ?", (EMAIL,)) == [{"otp": otp}]
+    other.execute_update("DELETE FROM otp_codes WHERE email = ?", (EMAIL,))
+    assert verify(client, otp).json()["detail"] == "OTP not found or expired"
+
+
+def test_versioned_cache_sees_writes_from_other_connections(client, app_db):
+    cache = VersionedCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return app_db.execute_query("SELECT name FROM offices")
+
+    first = cache.get("offices", "offices", load)
+    assert cache.get("offices", "offices", load) is first
+    assert len(loads) == 1
+
+    # A write through another engine, as another worker would make it
+    other = type(app_db)(app_db.db_path)
+    with other.transaction() as conn:
+        conn.execute("UPDATE offices SET name = 'Renamed'")
+    assert cache.get("offices", "offices", load)[0]["name"] == "Renamed"
+    assert len(loads) == 2
+
+    # Writes to other tables leave the entry alone
+    app_db.execute_update("DELETE FROM otp_codes")
+    cache.get("offices", "offices", load)
+    assert len(loads) == 2
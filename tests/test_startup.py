@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+# Cold-start budget for `import server`, the work every worker process and
+# test run pays before serving. Profile regressions with:
+#   cd backend && python -X importtime -c "import server" 2> importtime.log
+STARTUP_BUDGET_SECONDS = 1.0
+
+MEASURE_IMPORT = (
+    "import sys, time\n"
+    f"sys.path.insert(0, {BACKEND_DIR!r})\n"
+    "started = time.perf_counter()\n"
+    "import server\n"
+    "print(time.perf_counter() - started)\n"
+    "print('numpy' in sys.modules)\n"
+)
+
+
+def import_server(cwd):
+    # On-disk engine, so the laziness check below means something
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT], cwd=cwd, capture_output=True, text=True, check=True,
+        env={**os.environ, "DB_TYPE": "sqlite"}
+    )
+    seconds, numpy_loaded = result.stdout.split()
+    return float(seconds), numpy_loaded == "True"
+
+
+def test_import_stays_within_startup_budget(tmp_path):
+    # Best of three keeps a noisy machine from failing the budget on one slow run
+    timings = [import_server(tmp_path)[0] for _ in range(3)]
+    assert min(timings) < STARTUP_BUDGET_SECONDS, f"import server took {min(timings):.2f}s"
+
+
+def test_import_is_lazy(tmp_path):
+    _, numpy_loaded = import_server(tmp_path)
+    assert not numpy_loaded
+    assert not os.path.exists(tmp_path / "parking.db")
+
+
+def test_schema_setup_runs_once(tmp_path, monkeypatch):
+    from database import Database, SCHEMA_VERSION, create_database
+    runs = []
+    init_database = Database.init_database
+    monkeypatch.setattr(Database, "init_database", lambda self: runs.append(1) or init_database(self))
+    path = str(tmp_path / "parking.db")
+
+    database = create_database("sqlite", path)
+    database.ensure_schema()
+    database.ensure_schema()
+    database.connect().close()
+    assert len(runs) == 1
+
+    # A new engine (another worker, a restart) on an up-to-date file skips the DDL
+    create_database("sqlite", path).ensure_schema()
+    assert len(runs) == 1
+    conn = database.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+    # An older file is brought up to date
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+    create_database("sqlite", path).ensure_schema()
+    assert len(runs) == 2
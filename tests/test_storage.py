@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from database import create_database
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def engine(request, tmp_path):
+    database = create_database(request.param, str(tmp_path / 'parking.db'))
+    yield database
+    getattr(database, 'close', lambda: None)()
+
+
+def test_engines_share_schema_and_triggers(engine):
+    with engine.transaction() as conn:
+        conn.execute(
+            "INSERT INTO users (id, emp_id, name, email, phone, created_at) "
+            "VALUES ('u1', 'E1', 'Asha Rao', 'a@x', '1', 'now')"
+        )
+        conn.execute(
+            "INSERT INTO parking_requests (id, user_id, office_id, vehicle_type, vehicle_number, duration_type, "
+            "created_at, updated_at) VALUES ('r1', 'u1', 'o1', 'car', 'TN09', 'single_day', 'now', 'now')"
+        )
+
+    matches = engine.execute_query("SELECT request_id FROM request_search WHERE request_search MATCH 'asha'")
+    versions = engine.execute_query("SELECT version FROM cache_versions WHERE name = 'parking_requests'")
+    assert matches == [{"request_id": "r1"}]
+    assert versions[0]["version"] >= 1
+
+
+def test_memory_engine_stays_off_disk(tmp_path):
+    engine = create_database('memory', str(tmp_path / 'parking.db'))
+    engine.execute_update("INSERT INTO job_state (name, value) VALUES ('k', 'v')")
+    assert engine.execute_query("SELECT value FROM job_state") == [{"value": "v"}]
+    assert os.listdir(tmp_path) == []
+
+    engine.close()
+    assert engine.execute_query("SELECT value FROM job_state") == []
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        create_database('postgres')
@@ -0,0 +1,48 @@
+import sweeper
+from sweeper import sweep_expired_requests
+
+from .conftest import insert_request
+
+
+def test_sweep_batches_and_releases_each_slot_once(client, app_db):
+    app_db.execute_update("UPDATE offices SET total_car_slots = 10, available_car_slots = 5, "
+                          "total_bike_slots = 10, available_bike_slots = 5")
+    # Two shifts share C-1; C-3 stays held by an approval that has not ended
+    insert_request(app_db, "r1", day="2020-01-01", slot_number="C-1")
+    insert_request(app_db, "r2", day="2020-01-01", slot_number="C-1")
+    insert_request(app_db, "r3", day="2020-01-02", slot_number="C-2")
+    insert_request(app_db, "r4", day="2020-01-02", slot_number="C-3")
+    insert_request(app_db, "r5", day="2030-01-01", slot_number="C-3")
+    insert_request(app_db, "r6", day="2020-01-03", slot_number="B-1", vehicle_type="bike")
+
+    expired_before = sweeper.sweeper_metrics["requests_expired"]
+    cars_before = sweeper.sweeper_metrics["slots_reclaimed"]["car"]
+    runs_before = sweeper.sweeper_metrics["runs"]
+
+    # A batch of two forces several rounds; shared slots are counted in the round their last holder expires
+    reclaimed = sweep_expired_requests(today="2025-01-01", batch_size=2)
+
+    statuses = {row["id"]: row["status"] for row in app_db.execute_query("SELECT id, status FROM parking_requests")}
+    assert statuses == {"r1": "expired", "r2": "expired", "r3": "expired", "r4": "expired",
+                        "r5": "approved", "r6": "expired"}
+    office = app_db.execute_query("SELECT available_car_slots, available_bike_slots FROM offices")[0]
+    assert (office["available_car_slots"], office["available_bike_slots"]) == (7, 6)
+    assert reclaimed == 3
+
+    assert sweeper.sweeper_metrics["requests_expired"] - expired_before == 5
+    assert sweeper.sweeper_metrics["slots_reclaimed"]["car"] - cars_before == 2
+    assert sweeper.sweeper_metrics["runs"] - runs_before == 1
+    assert sweeper.sweeper_metrics["last_run_reclaimed"] == 3
+    assert sweeper.sweeper_metrics["last_error"] is None
+
+    assert app_db.execute_query(
+        "SELECT COUNT(*) AS n FROM request_events WHERE event_type = 'expired'"
+    )[0]["n"] == 5
+    assert sweep_expired_requests(today="2025-01-01") == 0
+
+
+def test_admins_cannot_mark_a_request_expired(client, app_db):
+    insert_request(app_db, "r1", day="2030-01-01", slot_number="C-1")
+    response = client.post("/api/admin/approve-request", json={"request_id": "r1", "status": "expired"})
+    assert response.status_code == 422
+    assert app_db.execute_query("SELECT status FROM parking_requests")[0]["status"] == "approved"
@@ -0,0 +1,86 @@
+from vehicles import find_vehicle_conflict, normalize_vehicle_number
+
+from .conftest import booking, insert_request
+
+
+def test_normalisation_and_numbers_without_letters_or_digits(client):
+    assert normalize_vehicle_number("tn-09 ab 1234") == normalize_vehicle_number("TN09AB1234") == "TN09AB1234"
+    assert client.post("/api/parking-requests", json=booking("E1", vehicle_number="--")).status_code == 422
+    assert client.post("/api/parking-requests", json=booking("E2", vehicle_number="  ")).status_code == 422
+
+
+def test_overlapping_booking_by_another_user_is_rejected(client):
+    assert client.post("/api/parking-requests", json=booking("E1", vehicle_number="KA-01", start_date="2030-01-01", end_date="2030-01-10")).status_code == 200
+    assert client.post("/api/parking-requests", json=booking("E2", "2030-01-05", vehicle_number="ka 01")).status_code == 409
+    assert client.post("/api/parking-requests", json=booking("E2", "2030-01-11", vehicle_number="KA01")).status_code == 200
+
+
+def test_reapproval_over_a_newer_booking_is_refused(client):
+    first = client.post("/api/parking-requests", json=booking("E1", vehicle_number="KA01", start_date="2030-01-01", end_date="2030-01-10")).json()
+    client.post("/api/admin/approve-request", json={"request_id": first["id"], "status": "rejected"})
+    assert client.post("/api/parking-requests", json=booking("E2", vehicle_number="KA01", start_date="2030-01-02", end_date="2030-01-03")).status_code == 200
+
+    response = client.post("/api/admin/approve-request", json={"request_id": first["id"], "status": "approved"})
+    assert response.status_code == 409
+    assert client.post("/api/parking-requests", json=booking("E3", vehicle_number="KA01", start_date="2030-01-05", end_date="2030-01-06")).status_code == 200
+
+
+def test_lookup_finds_overlaps_hidden_behind_legacy_rows(app_db):
+    for request_id, first, last in (("long", "2030-01-01", "2030-01-10"), ("short", "2030-01-02", "2030-01-03")):
+        insert_request(app_db, request_id, day=None, vehicle_number="KA01", duration_type="date_range",
+                       start_date=first, end_date=last)
+    with app_db.transaction() as conn:
+        assert find_vehicle_conflict(conn, "KA01", "2030-01-05", "2030-01-06")["id"] == "long"
+        assert find_vehicle_conflict(conn, "KA01", "2030-01-11", "2030-01-12") is None
+
+
+def test_same_user_merge_stays_within_one_office(client, app_db):
+    first = client.post("/api/parking-requests", json=booking("E1", vehicle_number="KA01", start_date="2030-01-01", end_date="2030-01-03")).json()
+    merged = client.post("/api/parking-requests", json=booking("E1", vehicle_number="KA01", start_date="2030-01-03", end_date="2030-01-05")).json()
+    assert merged["id"] == first["id"]
+    assert (merged["start_date"], merged["end_date"]) == ("2030-01-01", "2030-01-05")
+
+    app_db.execute_update("UPDATE parking_requests SET office_id = 'other-office' WHERE id = ?", (first["id"],))
+    response = client.post("/api/parking-requests", json=booking("E1", vehicle_number="KA01", start_date="2030-01-05", end_date="2030-01-07"))
+    assert response.status_code == 409
+    assert app_db.execute_query("SELECT end_date FROM parking_requests WHERE id = ?", (first["id"],))[0]["end_date"] == "2030-01-05"
+
+
+def test_migration_backfills_normalised_numbers(temp_db):
+    conn = temp_db._open()
+    conn.execute("""
+        CREATE TABLE parking_requests (
+            id TEXT PRIMARY KEY, user_id TEXT NOT NULL, office_id TEXT NOT NULL, vehicle_type TEXT NOT NULL,
+            vehicle_number TEXT NOT NULL, duration_type TEXT NOT NULL, parking_date TEXT, start_date TEXT,
+            end_date TEXT, recurring_pattern TEXT, description TEXT, status TEXT DEFAULT 'pending',
+            slot_number TEXT, approved_by TEXT, rejection_reason TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    conn.execute(
+        "INSERT INTO parking_requests (id, user_id, office_id, vehicle_type, vehicle_number, duration_type, "
+        "parking_date, created_at, updated_at) VALUES ('r1', 'u', 'o', 'car', 'tn-09 ab 1', 'single_day', "
+        "'2030-01-01', 'now', 'now')"
+    )
+    conn.commit()
+    conn.close()
+
+    temp_db.ensure_schema()
+    assert temp_db.execute_query("SELECT vehicle_number_norm FROM parking_requests") == [{"vehicle_number_norm": "TN09AB1"}]
+
+
+def test_lookup_seeks_the_active_bookings_index(app_db):
+    conn = app_db.connect()
+    plan = []
+    original = conn.execute
+
+    class Recorder:
+        def execute(self, sql, params=()):
+            plan.extend(row[-1] for row in original(f"EXPLAIN QUERY PLAN {sql}", params))
+            return original(sql, params)
+
+    find_vehicle_conflict(Recorder(), "KA01", "2030-01-01", "2030-01-02")
+    conn.close()
+    assert plan == ["SEARCH parking_requests USING INDEX idx_parking_requests_vehicle_active "
+                    "(vehicle_number_norm=? AND <expr><?)"]
+    names = {row["name"] for row in app_db.execute_query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_parking_requests_vehicle_interval" not in names
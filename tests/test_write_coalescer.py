@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from coalescer import WriteCoalescer
+
+
+def _insert_office(office_id):
+    def unit(conn):
+        conn.execute(
+            "INSERT INTO offices (id, name, location, total_car_slots, total_bike_slots, "
+            "available_car_slots, available_bike_slots, created_at) VALUES (?, ?, 'x', 1, 1, 1, 1, 'now')",
+            (office_id, office_id)
+        )
+        return office_id
+    return unit
+
+
+def test_concurrent_units_share_commits(app_db):
+    coalescer = WriteCoalescer(window=0.05, max_batch=100)
+    gate = threading.Barrier(20)
+    results = []
+
+    def worker(i):
+        gate.wait()
+        results.append(coalescer.run(_insert_office(f"office-{i}")))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == sorted(f"office-{i}" for i in range(20))
+    assert app_db.execute_query("SELECT COUNT(*) AS n FROM offices")[0]["n"] == 20
+    assert coalescer.stats["batches"] < 20
+
+
+def test_failing_unit_rolls_back_alone(app_db):
+    coalescer = WriteCoalescer(window=0.05, max_batch=100)
+
+    def half_done(conn):
+        _insert_office("partial")(conn)
+        raise ValueError("boom")
+
+    good = coalescer.submit(_insert_office("kept"))
+    bad = coalescer.submit(half_done)
+    duplicate = coalescer.submit(_insert_office("kept"))
+
+    assert good.result() == "kept"
+    with pytest.raises(ValueError):
+        bad.result()
+    with pytest.raises(Exception):
+        duplicate.result()
+    rows = app_db.execute_query("SELECT id FROM offices ORDER BY id")
+    assert [row["id"] for row in rows] == ["kept"]